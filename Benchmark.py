@@ -0,0 +1,546 @@
+import gc
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import collections
+import platform
+import tempfile
+import zipfile
+import tracemalloc
+import xml.etree.ElementTree
+import LinkTokenizer
+import WikidotHelpers
+import LinkGraph
+import MetadataReader
+import CaseAnalysis
+import LinkGroups
+import ExternalSort
+import LinkSpelling
+import Redirects
+import PageCache
+import SiteGenerator
+import SiteLoader
+import ZipSite
+from SiteLoader import PageInfo
+
+# Benchmarks for the performance-sensitive parts of CaseAnalysis
+# Usage:  python Benchmark.py [benchmark name ...] [--pages N ...] [--json results.json] [--workdir dir]
+#   With no names, all benchmarks are run.
+#   The "site" benchmark generates synthetic sites of each of the --pages sizes and times each phase of the analysis on them.
+#   --json saves the results in machine-readable form, so that runs can be compared to spot regressions.
+
+
+# *****************************************************************
+# Return the best wall-clock time of several runs of fn(*args)
+def Time(fn, *args, repeat=3):
+    best=None
+    for i in range(repeat):
+        start=time.perf_counter()
+        fn(*args)
+        elapsed=time.perf_counter()-start
+        if best is None or elapsed < best:
+            best=elapsed
+    return best
+
+
+# *****************************************************************
+# *****************************************************************
+# Link tokenizer
+
+# -----------------------------------
+# The link scan as it was before LinkTokenizer: it slices off the processed text after every link, so it is quadratic in the number of links
+def SlicingPageLinks(source):
+    links=set()
+    while len(source) > 0:
+        loc=source.find("[[[")
+        if loc == -1:
+            break
+        loc2=source.find("]]]", loc)
+        if loc2 == -1:
+            break
+        link=source[loc+3:loc2]
+        if "|" in link:
+            link=link[:link.find("|")]
+        links.add(link.strip())
+        source=source[loc2:]
+    return links
+
+# -----------------------------------
+# Make the source of a page with nLinks links separated by ordinary text
+def MakeLinkPage(nLinks, rng):
+    parts=[]
+    for i in range(nLinks):
+        parts.append("Some ordinary text about fandom and fanzines, with a link to ")
+        if rng.random() < 0.3:
+            parts.append("[[[Page "+str(rng.randrange(nLinks))+"|display text]]]")
+        else:
+            parts.append("[[[Page "+str(rng.randrange(nLinks))+"]]]")
+        parts.append(".\n")
+    return "".join(parts)
+
+# -----------------------------------
+def BenchmarkLinkTokenizer(sizes=(1000, 2000, 4000, 8000, 16000)):
+    rng=random.Random(0)
+    results=[]
+    print("Link tokenizer: time to extract the links from one page")
+    print("   links    slicing (s)  tokenizer (s)  tokenizer us/link")
+    for n in sizes:
+        source=MakeLinkPage(n, rng)
+        assert SlicingPageLinks(source) == LinkTokenizer.PageLinks(source)
+        slicing=Time(SlicingPageLinks, source)
+        tokenizer=Time(LinkTokenizer.PageLinks, source)
+        print("%8d  %12.4f  %13.4f  %17.3f" % (n, slicing, tokenizer, 1e6*tokenizer/n))
+        results.append({"links": n, "slicing": slicing, "tokenizer": tokenizer})
+    return results
+
+
+# *****************************************************************
+# *****************************************************************
+# Canonicization
+
+# Names chosen to exercise the corners of the canonicization rules: categories, extra colons, leading and trailing junk, underscores,
+# runs of spaces, non-ASCII letters, digits and marks, and characters whose case mapping changes their length
+CanonicizeCorpus=[
+    "", " ", "_", "-", ":", "::", ":a", "a:", "a::b", "a:b:c d", "Category:Foo Bar", "category: foo :bar",
+    "Page", "page", "PAGE", "  Page  ", "Page_Name", "Page__Name", "Page - Name", "-Page-", "--a--b--", "a-", "-a", "'a'", "a!",
+    "Page  Name", "Page   Name", " _ Page _ ", "\tPage\t", "Page\nName", "Page\u00a0Name",
+    "Farmer", "F\u00e1rmer", "Fa\u0301rmer", "\u00dfeta", "\u01c5ungla", "\u0130stanbul", "\u0149x", "\ufb01le",
+    "\u00bd", "\u2155 x", "\u0661\u0662", "\u00b2", "\u4e2d\u6587 \u9875", "\U0001d400bc", "\u2167", "\u0391\u03a3", "\u0391\u03a3 B", "\u03a3\u0391", "\u0130:\u0130",
+    "ANSIBLE", "Ansible!!!", "http://www.ansible.com", "[[[x]]]", "a|b", "O'Brien", "Smith, John", "1939", "1939 Worldcon",
+]
+
+# -----------------------------------
+# Build a corpus of names: the hand-picked ones above plus random names drawn from an alphabet of troublesome characters
+def MakeCanonicizeCorpus(n, rng):
+    alphabet="aAbBzZ09 _-:'.,!()\t\u00e1\u00c1\u0301\u00df\u01c5\u0130\u00bd\u0661\u4e2d\u00a0\ufb01\u03a3\u0391"
+    names=list(CanonicizeCorpus)
+    while len(names) < n:
+        names.append("".join(rng.choice(alphabet) for i in range(rng.randint(0, 24))))
+    return names
+
+# -----------------------------------
+# Check that CannonicizeBatch() and CannonicizeFast() give exactly the same results as CannonicizeUncached().  Returns the number of names checked.
+# The all-ASCII names are also checked as a batch of their own, since CannonicizeBatch() takes a different path for them.
+def CheckCanonicizeConformance(names):
+    asciiNames=[n for n in names if n.isascii()]
+    if asciiNames != names:
+        CheckCanonicizeConformance(asciiNames)
+
+    wikidot=WikidotHelpers.CannonicizeBatch(names)
+    for i, name in enumerate(names):
+        expected=WikidotHelpers.CannonicizeUncached(name)
+        if WikidotHelpers.CannonicizeFast(name) != expected or wikidot[i] != expected[0]:
+            raise AssertionError("Wikidot canonicization of "+repr(name)+" differs: "+repr(wikidot[i])+" instead of "+repr(expected[0]))
+    return len(names)
+
+# -----------------------------------
+def BenchmarkCanonicize(n=100000):
+    rng=random.Random(0)
+    print("Canonicization conformance: "+str(CheckCanonicizeConformance(MakeCanonicizeCorpus(20000, rng)))+" names match")
+
+    # For the throughput test, use names which look like real link text
+    names=["Page "+str(rng.randrange(n))+rng.choice(["", " (fanzine)", "_Name", "  Con", ": Part 2"]) for i in range(n)]
+    results={"names": n}
+    print("Canonicization: time to canonicize "+str(n)+" names")
+    print("   form         scalar (s)   batch (s)   speedup")
+    for form, scalar, batch in [("Wikidot", lambda l: [WikidotHelpers.CannonicizeUncached(x)[0] for x in l], WikidotHelpers.CannonicizeBatch)]:
+        scalarTime=Time(scalar, names)
+        batchTime=Time(batch, names)
+        print("   %-10s %11.4f %11.4f %9.1fx" % (form, scalarTime, batchTime, scalarTime/batchTime))
+        results[form]={"scalar": scalarTime, "batch": batchTime}
+    return results
+
+
+# *****************************************************************
+# *****************************************************************
+# Link graph memory
+
+# -----------------------------------
+# Make a site dictionary like the one LoadDirectory produces, with fresh string objects for every link, just as parsing the pages would give
+def MakeMemorySite(nPages, linksPerPage, rng):
+    site={}
+    for i in range(nPages):
+        name="page-"+str(i)
+        if rng.random() < 0.1:
+            site[name]=PageInfo("Page "+str(i), name, ["tag"], None, "Page "+str(rng.randrange(nPages)))
+            continue
+        links={"".join(["Page ", str(rng.randrange(nPages)), rng.choice(["", "_", "!"])]) for j in range(linksPerPage)}
+        site[name]=PageInfo("Page "+str(i), name, ["tag", "fanzine"], links, None)
+    return site
+
+# -----------------------------------
+def BenchmarkLinkGraphMemory(sizes=(10000, 50000), linksPerPage=20):
+    rng=random.Random(0)
+    results=[]
+    print("Link graph: memory held by the site (MB)")
+    print("     pages   site+inverseSite   LinkGraph   ratio")
+    for n in sizes:
+        gc.collect()
+        tracemalloc.start()
+        site=MakeMemorySite(n, linksPerPage, rng)
+        inverseSite=CaseAnalysis.BuildInverseSite(site)
+        dictsSize=tracemalloc.get_traced_memory()[0]
+
+        graph=LinkGraph.LinkGraph.FromSite(site)
+        assert graph.InverseSite() == inverseSite
+        del site, inverseSite
+        gc.collect()
+        graphSize=tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del graph
+
+        print("%10d  %17.1f  %10.1f  %6.2f" % (n, dictsSize/1e6, graphSize/1e6, dictsSize/graphSize))
+        results.append({"pages": n, "dicts": dictsSize, "graph": graphSize})
+    return results
+
+
+# *****************************************************************
+# *****************************************************************
+# Metadata reading
+
+# -----------------------------------
+# Read the title and tags of a page the way the loader used to: build the whole element tree of its .xml file
+def FullParseMetadata(pathname):
+    e=xml.etree.ElementTree.parse(pathname).getroot()
+    tagsEl=e.find("tags")
+    return MetadataReader.PageMetadata(e.find("title").text, [t.text for t in tagsEl.findall("tag")] if tagsEl is not None else None)
+
+# -----------------------------------
+# Write n pages' metadata files with SaveMetadata.  Each has a title and (usually) tags, followed by extraBytes of other metadata.
+def MakeMetadataDir(dir, n, extraBytes, rng):
+    os.makedirs(dir, exist_ok=True)
+    for i in range(n):
+        pathname=os.path.join(dir, "page-"+str(i))
+        pageData={"title": "Page "+str(i), "tags": rng.sample(["fan", "zine", "con", "apa"], rng.randint(0, 3)), "updated_at": "2019-02-07 12:00:00"}
+        if extraBytes > 0:
+            pageData["comments"]=" ".join("comment"+str(j) for j in range(extraBytes//10))
+        WikidotHelpers.SaveMetadata(pathname, pageData)
+        with open(pathname+".txt", "w") as f:
+            f.write("")
+
+# -----------------------------------
+def BenchmarkMetadata(n=2000, extraSizes=(0, 1000, 100000)):
+    rng=random.Random(0)
+    results=[]
+    top=tempfile.mkdtemp(prefix="CaseAnalysisMetadata")
+    try:
+        print("Metadata: time to read the title and tags of "+str(n)+" pages")
+        print("   extra bytes   full parse (s)   reader (s)   bulk index (s)   speedup")
+        for extra in extraSizes:
+            dir=os.path.join(top, str(extra))
+            MakeMetadataDir(dir, n if extra < 100000 else n//10, extra, rng)
+            pathnames=sorted(os.path.join(dir, f) for f in os.listdir(dir) if f.endswith(".xml"))
+            expected=[FullParseMetadata(p) for p in pathnames]
+            assert [MetadataReader.ReadMetadataFile(p) for p in pathnames] == expected
+            assert dict(MetadataReader.ReadMetadataIndex(dir)) == {os.path.basename(p)[:-4]: md for p, md in zip(pathnames, expected)}
+
+            full=Time(lambda: [FullParseMetadata(p) for p in pathnames])
+            reader=Time(lambda: [MetadataReader.ReadMetadataFile(p) for p in pathnames])
+            bulk=Time(MetadataReader.ReadMetadataIndex, dir)
+            print("   %11d   %14.4f   %10.4f   %14.4f   %7.1fx" % (extra, full, reader, bulk, full/reader))
+            results.append({"extraBytes": extra, "files": len(pathnames), "fullParse": full, "reader": reader, "bulkIndex": bulk})
+    finally:
+        shutil.rmtree(top, ignore_errors=True)
+    return results
+
+
+# *****************************************************************
+# *****************************************************************
+# Out-of-core grouping
+
+# -----------------------------------
+def BenchmarkExternalSort(n=20000, linksPerPage=20, budgets=(None, 64, 16, 4)):
+    rng=random.Random(0)
+    site=MakeMemorySite(n, linksPerPage, rng)
+    results=[]
+    print("Link grouping: in memory and sorted on disk, "+str(n)+" pages")
+    print("   budget (MB)   time (s)   peak memory (MB)   runs")
+    def Group(budget):
+        if budget is None:
+            return LinkGroups.GroupLinks(CaseAnalysis.BuildInverseSite(site))
+        return ExternalSort.GroupLinksExternal(site.items(), budget*1024*1024)
+
+    # Each budget is run twice: once for the time, and once (since tracing slows it down a lot) under tracemalloc for the peak memory.
+    # The second run just consumes the groups as they come, as a report would, rather than keeping them all.
+    expected=None
+    for budget in budgets:
+        gc.collect()
+        ExternalSort.Metrics.metrics.Reset()
+        start=time.perf_counter()
+        groups=list(Group(budget))
+        elapsed=time.perf_counter()-start
+        runs=ExternalSort.Metrics.metrics.counters.get("sortRuns", 0)
+        if expected is None:
+            expected=groups
+        assert groups == expected
+        del groups
+
+        gc.collect()
+        tracemalloc.start()
+        collections.deque(Group(budget), maxlen=0)
+        peak=tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print("   %11s   %8.3f   %16.1f   %4d" % ("in memory" if budget is None else budget, elapsed, peak/1e6, runs))
+        results.append({"budget": budget, "time": elapsed, "peak": peak, "runs": runs})
+    return results
+
+
+# *****************************************************************
+# *****************************************************************
+# Misspelled links
+
+# -----------------------------------
+# Make n distinct made-up names of one to three words, with a few accented letters.  (The words are built from syllables, so that their
+# trigrams are about as varied as those of real page names.)
+def MakeSpellingTitles(n, rng):
+    onsets=["b", "bl", "br", "ch", "d", "dr", "f", "fl", "g", "gr", "h", "j", "k", "l", "m", "n", "p", "pl", "r", "s", "sh", "st", "t",
+            "th", "tr", "v", "w", "y", "z"]
+    vowels=["a", "e", "i", "o", "u", "ai", "ea", "oo", "ou", "é", "ü"]
+    codas=["", "", "", "n", "r", "s", "t", "nd", "ng", "rt", "ck", "ll"]
+    words=["".join(rng.choice(onsets)+rng.choice(vowels)+rng.choice(codas) for j in range(rng.randint(1, 3))) for i in range(n)]
+    titles=set()
+    while len(titles) < n:
+        titles.add(" ".join(rng.choice(words).capitalize() for j in range(rng.randint(1, 3))))
+    return sorted(titles)
+
+# -----------------------------------
+# Make a site whose links include misspellings of its pages' titles: typos, accents dropped, ALL-CAPS, markup, and links to pages which don't exist
+def MakeMisspelledSite(nPages, linksPerPage, rng):
+    titles=MakeSpellingTitles(nPages, rng)
+
+    def Typo(title):
+        p=rng.randrange(len(title))
+        kind=rng.randrange(4)
+        if kind == 0:
+            return title[:p]+title[p+1:]
+        if kind == 1:
+            return title[:p]+rng.choice("aeiourst")+title[p:]
+        if kind == 2:
+            return title[:p]+rng.choice("aeiourst")+title[p+1:]
+        return title[:p]+title[p+1:p+2]+title[p:p+1]+title[p+2:]
+
+    def LinkText(title):
+        kind=rng.randrange(20)
+        if kind == 0:
+            return Typo(title)
+        if kind == 1:
+            return LinkSpelling.FoldAccents(title).upper()
+        if kind == 2:
+            return "**"+title+"**"
+        if kind == 3:
+            return "Missing "+rng.choice(titles)
+        return title
+
+    site={}
+    for title in titles:
+        name=WikidotHelpers.CannonicizeFast(title)[0]
+        links={LinkText(rng.choice(titles)) for j in range(linksPerPage)}
+        site[name]=PageInfo(title, name, [], links, None)
+    return site
+
+# -----------------------------------
+# The probable misspellings found by comparing every broken link with every page name, as (link, distance) pairs
+def BruteForceMisspellings(site, inverseSite):
+    index=LinkSpelling.BuildNameIndex(site)
+    found=[]
+    for link in inverseSite:
+        if WikidotHelpers.Cannonicize(link) in site:
+            continue
+        name=LinkSpelling.NormalizeLink(link)
+        k=LinkSpelling.MaxDistance(name)
+        distances=[LinkSpelling.EditDistance(name, n, k) for n in index.names]
+        best=min(distances, default=k+1)
+        if best <= k:
+            found.append((link, best))
+    return found
+
+# -----------------------------------
+# Time the report on sites of each of the sizes, and then on one site with each number of links per page
+def BenchmarkMisspellings(sizes=(5000, 10000, 20000), linksPerPage=(5, 10, 20), checkSize=1000):
+    rng=random.Random(0)
+
+    # Check that the index finds the same misspellings as comparing everything with everything
+    site=MakeMisspelledSite(checkSize, 10, rng)
+    inverseSite=CaseAnalysis.BuildInverseSite(site)
+    found=[(m.Link, m.Distance) for m in LinkSpelling.ProbableMisspellings(site, inverseSite)]
+    assert found == BruteForceMisspellings(site, inverseSite)
+    print("Misspelled links: "+str(len(found))+" found in a "+str(checkSize)+" page site, the same as by comparing every link with every page")
+
+    results=[]
+    print("     pages   links/page   broken links   misspellings   time (s)   us per broken link")
+    for n, links in [(n, 10) for n in sizes]+[(sizes[-1], l) for l in linksPerPage if l != 10]:
+        site=MakeMisspelledSite(n, links, rng)
+        inverseSite=CaseAnalysis.BuildInverseSite(site)
+        LinkSpelling.Metrics.metrics.Reset()
+        start=time.perf_counter()
+        count=len(LinkSpelling.ProbableMisspellings(site, inverseSite))
+        elapsed=time.perf_counter()-start
+        broken=LinkSpelling.Metrics.metrics.counters["brokenLinks"]
+        print("%10d   %10d   %12d   %12d   %8.3f   %18.1f" % (n, links, broken, count, elapsed, 1e6*elapsed/broken))
+        results.append({"pages": n, "linksPerPage": links, "brokenLinks": broken, "misspellings": count, "time": elapsed})
+    return results
+
+
+# *****************************************************************
+# *****************************************************************
+# Report passes
+
+# -----------------------------------
+# Write the reports the way RunReports used to: each report on its own (see CaseAnalysis.RunPass), scanning the site for itself
+def RunReportsSeparately(analysis, outputDir, dump):
+    fileDump=open(os.path.join(outputDir, "Dump of process output.txt"), "w") if dump else None
+    with open(os.path.join(outputDir, CaseAnalysis.MultipleFormsPass.Filename), "w") as f:
+        CaseAnalysis.WriteMultipleForms(analysis.Groups(), f, fileDump)
+    if fileDump is not None:
+        fileDump.close()
+    with open(os.path.join(outputDir, CaseAnalysis.LowercaseRedirectsPass.Filename), "w") as f:
+        CaseAnalysis.ReportLowercaseRedirects(analysis.site, f)
+    with open(os.path.join(outputDir, CaseAnalysis.DoubleRedirectsPass.Filename), "w") as f:
+        CaseAnalysis.ReportDoubleRedirects(analysis.site, analysis.Redirects, f)
+    with open(os.path.join(outputDir, CaseAnalysis.MissingRedirectTargetsPass.Filename), "w") as f:
+        CaseAnalysis.ReportMissingRedirectTargets(analysis.site, analysis.Redirects, f)
+
+# -----------------------------------
+def BenchmarkReports(n=50000, linksPerPage=20):
+    rng=random.Random(0)
+    analysis=CaseAnalysis.SiteAnalysis(MakeMemorySite(n, linksPerPage, rng))
+    analysis.InverseSite, analysis.Redirects        # (Built before the timing starts, since all the ways of running the reports share them)
+    reports=["multiple", "lowercase", "double", "missing"]
+    filenames=[CaseAnalysis.Reports[r].Filename for r in reports]+["Dump of process output.txt"]
+
+    results=[]
+    print("Reports: separately and as passes, "+str(n)+" pages")
+    print("   how                          time (s)")
+    with tempfile.TemporaryDirectory() as dir:
+        outputs={}
+        for how, dump, run in [("separately, with dump", True, lambda out: RunReportsSeparately(analysis, out, True)),
+                               ("passes, with dump", True, lambda out: CaseAnalysis.RunReports(analysis, out, reports, True)),
+                               ("separately", False, lambda out: RunReportsSeparately(analysis, out, False)),
+                               ("passes", False, lambda out: CaseAnalysis.RunReports(analysis, out, reports)),
+                               ("passes, concurrent", False, lambda out: CaseAnalysis.RunReports(analysis, out, reports, False, True))]:
+            out=os.path.join(dir, str(len(results)))
+            os.makedirs(out)
+            with open(os.devnull, "w") as devnull:      # (RunReports prints the summary)
+                stdout=sys.stdout
+                sys.stdout=devnull
+                try:
+                    elapsed=Time(run, out, repeat=1)
+                finally:
+                    sys.stdout=stdout
+
+            # All the ways must write the same reports
+            for filename in filenames if dump else filenames[:-1]:
+                with open(os.path.join(out, filename), "rb") as f:
+                    data=f.read()
+                assert outputs.setdefault(filename, data) == data, how+": "+filename
+            print("   %-26s   %8.3f" % (how, elapsed))
+            results.append({"how": how, "time": elapsed})
+    return results
+
+
+# *****************************************************************
+# *****************************************************************
+# The phases of a complete analysis, on a generated site
+
+# -----------------------------------
+# Run fn(*args) once, returning its result and a dictionary of its wall-clock and CPU time
+def TimePhase(fn, *args):
+    wall=time.perf_counter()
+    cpu=time.process_time()
+    result=fn(*args)
+    return result, {"wall": time.perf_counter()-wall, "cpu": time.process_time()-cpu}
+
+# -----------------------------------
+def BenchmarkSite(sizes=(1000, 10000), workdir=None):
+    results=[]
+    top=workdir or tempfile.mkdtemp(prefix="CaseAnalysisBenchmark")
+    try:
+        for n in sizes:
+            siteDir=os.path.join(top, "site"+str(n))
+            if not os.path.isdir(siteDir):      # A site left in --workdir by an earlier run is reused
+                SiteGenerator.GenerateSite(siteDir, pages=n)
+            phases={}
+            devnull=open(os.devnull, "w")
+
+            site={}
+            _, phases["load"]=TimePhase(SiteLoader.LoadDirectory, site, siteDir, 1)
+            parallelSite={}
+            _, phases["loadParallel"]=TimePhase(SiteLoader.LoadDirectory, parallelSite, siteDir, 0)
+            assert parallelSite == site
+            cacheFile=os.path.join(top, "cache"+str(n)+".pickle")
+            cache=PageCache.PageCache(cacheFile)
+            SiteLoader.LoadDirectory({}, siteDir, 1, cache)
+            cache.Save()
+            cachedSite={}
+            _, phases["loadCached"]=TimePhase(lambda: SiteLoader.LoadDirectory(cachedSite, siteDir, 1, PageCache.PageCache(cacheFile)))
+            assert cachedSite == site
+            zipPathname=os.path.join(top, "site"+str(n)+".zip")
+            if not os.path.isfile(zipPathname):
+                with zipfile.ZipFile(zipPathname, "w", zipfile.ZIP_DEFLATED) as z:
+                    for entry in os.scandir(siteDir):
+                        z.write(entry.path, "source/"+entry.name)
+            zipSite={}
+            _, phases["loadZip"]=TimePhase(ZipSite.LoadZip, zipSite, zipPathname, 1)
+            assert zipSite == site
+
+            inverseSite, phases["inverse"]=TimePhase(CaseAnalysis.BuildInverseSite, site)
+            _, phases["sortAndGroup"]=TimePhase(lambda: sum(1 for g in LinkGroups.GroupLinks(inverseSite)))
+            _, phases["reportMultipleForms"]=TimePhase(CaseAnalysis.ReportMultipleForms, inverseSite, devnull, devnull)
+            _, phases["reportLowercaseRedirects"]=TimePhase(CaseAnalysis.ReportLowercaseRedirects, site, devnull)
+            redirects, phases["resolveRedirects"]=TimePhase(Redirects.RedirectResolver, site)
+            _, phases["reportDoubleRedirects"]=TimePhase(CaseAnalysis.ReportDoubleRedirects, site, redirects, devnull)
+            _, phases["reportMissingRedirectTargets"]=TimePhase(CaseAnalysis.ReportMissingRedirectTargets, site, redirects, devnull)
+            devnull.close()
+
+            print("Site with "+str(n)+" pages, "+str(len(inverseSite))+" distinct links")
+            print("   phase                          wall (s)    cpu (s)")
+            for phase, t in phases.items():
+                print("   %-28s %10.4f %10.4f" % (phase, t["wall"], t["cpu"]))
+            results.append({"pages": n, "links": len(inverseSite), "phases": phases})
+    finally:
+        if workdir is None:
+            shutil.rmtree(top, ignore_errors=True)
+    return results
+
+
+# *****************************************************************
+# *****************************************************************
+# Each benchmark is called with the parsed command line arguments and returns its results
+Benchmarks={
+    "tokenizer": lambda args: BenchmarkLinkTokenizer(),
+    "canonicize": lambda args: BenchmarkCanonicize(),
+    "graphmemory": lambda args: BenchmarkLinkGraphMemory(),
+    "metadata": lambda args: BenchmarkMetadata(),
+    "externalsort": lambda args: BenchmarkExternalSort(),
+    "misspellings": lambda args: BenchmarkMisspellings(),
+    "reports": lambda args: BenchmarkReports(),
+    "site": lambda args: BenchmarkSite(args.pages, args.workdir),
+}
+
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser(description="Benchmarks for CaseAnalysis")
+    parser.add_argument("benchmarks", nargs="*", help="the benchmarks to run: "+", ".join(Benchmarks.keys()))
+    parser.add_argument("--pages", type=int, nargs="+", default=[1000, 10000], help="the sizes of the generated sites")
+    parser.add_argument("--json", help="save the results in this file")
+    parser.add_argument("--workdir", help="keep the generated sites in this directory (and reuse them on later runs)")
+    args=parser.parse_args()
+
+    names=args.benchmarks or list(Benchmarks.keys())
+    for name in names:
+        if name not in Benchmarks:
+            print("Unknown benchmark '"+name+"'.  The benchmarks are: "+", ".join(Benchmarks.keys()))
+            sys.exit(1)
+
+    results={}
+    for name in names:
+        results[name]=Benchmarks[name](args)
+        print()
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(), "platform": platform.platform(),
+                       "cpus": os.cpu_count(), "results": results}, f, indent=2)
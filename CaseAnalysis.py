@@ -1,152 +1,40 @@
 import os
+import argparse
 import collections
-import xml.etree.ElementTree
 import WikidotHelpers
-
-#TODO: Need to deal with accented letter (e.g. Farmer)
-#TODO: Need to deal with embedded hyperlinks (e.g., Ansible)
-#TODO: Need to deal with ALL-CAPS (are we ignoring all of the pages we ought to be?)
-
-log = open("log.txt", "w")
+import PageCache
+import LinkGroups
+import Redirects
+import Metrics
+import ZipSite
+import ExternalSort
+import LinkSpelling
+import ReportPasses
+import SiteDatabase
+from SiteLoader import LoadDirectory
+
+# Analyze the links in a Wikidot site image, looking for links which Wikidot resolves but Mediawiki wouldn't, and for problem redirects.
+#
+# This can be used as a library:
+#       analysis=CaseAnalysis.SiteAnalysis.FromDirectory(root)
+#       for group in analysis.MultipleForms(): ...
+# The site is loaded once, and the inverse link map and the redirect resolution are built the first time a report needs them and then reused.
+#
+# Or from the command line:
+#       python CaseAnalysis.py <site directory or backup zip> [--output dir] [--reports multiple lowercase double missing misspelled] [--workers N] ...
+# The reports are run as passes over the loaded site (see ReportPasses).
+#
+# Accented letters (e.g. Farmer), embedded hyperlinks (e.g., Ansible) and ALL-CAPS in broken links are dealt with by the misspelled links
+# report (see LinkSpelling).
+
+log=None     # The log file, if any.  (It is opened by the command line program, not when this module is imported.)
 
 def logger(message):
-    print(message, file=log)
+    if log is not None:
+        print(message, file=log)
     print(message)
 
 
-#*******************************************************************************
-# Generate the Wikimedia canonicized form of a name
-# Note that for now we are ignoring the possibility of namespace: prefixes
-def MediawikiCanonicize(name):
-    if name is None or name is "":
-        return name
-
-    # Underscores are treated as spaces
-    name=name.replace("_", " ")
-
-    # Leading and trailing spaces and underscores are ignored
-    name=name.strip()
-
-    # Multiple consecutive spaces are treated as a single space
-    while "  " in name:
-        name=name.replace("  ", " ")
-
-    # Wikimedia always treats the 1st character as capital
-    name=name[:1].upper()+name[1:]
-
-    return name
-
-
-#*******************************************************************************
-# Define the PageInfo tuple
-PageInfo=collections.namedtuple("PageInfo", "Title, CanName, Tags, Links, Redirect")
-
-
-#==================================================================
-# Load the pages in the site directory
-def LoadDirectory(site, dir):
-    if not os.path.isdir(dir):
-        return
-
-    # First deal with any pages in this directory
-    for (dirpath, dirnames, filenames) in os.walk(dir):
-        break
-
-    filenames=[os.path.splitext(f)[0] for f in filenames if os.path.splitext(f)[1].lower() == ".txt"]
-    for fname in filenames:
-        LoadPage(site, dirpath, fname)
-
-
-#==================================================================
-# Load a single page
-# Locate its links and add this page to the lists of pages that this page points to
-def LoadPage(site, dirpath, fname):
-
-    if fname.startswith("index_"):
-        return
-
-    pathname=os.path.join(dirpath, fname)
-
-    # Read the tags and title from pathname.xml
-    e=xml.etree.ElementTree.parse(pathname+".xml").getroot()
-    title=e.find("title").text
-
-    tagsEl=e.find("tags")
-    tags=None
-    if tagsEl is not None:
-        tags=[t.text for t in tagsEl.findall("tag")]
-
-    #print(fname)
-
-    f=open(os.path.join(pathname+".txt"), "rb") # Reading in binary and doing the funny decode is to handle special characters embedded in some sources.
-    source=f.read().decode("cp437")
-    f.close()
-
-    def IsRedirect(pageText):
-        pageText=pageText.strip()  # Remove leading and trailing whitespace
-        if pageText.lower().startswith('[[module redirect destination="') and pageText.endswith('"]]'):
-            return pageText[31:].rstrip('"]')
-        return None
-
-    # First, check to see if this is a redirect.  If it is, we're done.
-    redirect=IsRedirect(source)
-    if redirect:
-        site[fname]=PageInfo(title, fname, tags, None, redirect)
-        return
-
-    # Now we scan the source for links.
-    # A link is one of these formats:
-    #   [[[link]]]
-    #   [[[link|display text]]]
-    links=set()    # Links is a *set* of all the unique pages pointed to by this page. (We use the set because we don't care about order, but do care about duplicates.)
-    while len(source) > 0:
-        loc=source.find("[[[")
-        if loc == -1:
-            break
-        loc2=source.find("]]]", loc)
-        if loc2 == -1:
-            break
-        link=source[loc+3:loc2]
-        # Now look at the possibility of the link containing display text.  If there is a "|" in the link, then only the text to the left of the "|" is the link
-        if "|" in link:
-            link=link[:link.find("|")]
-        links.add(link.strip())
-        # trim off the text which has been processed and try again
-        source=source[loc2:]
-
-    site[fname]=PageInfo(title, fname, tags, links, None)
-
-    return
-
-# *****************************************************************
-# *****************************************************************
-# Main
-
-root=r"C:\Users\mlo\Documents\usr\Fancyclopedia\Python\site"
-fileReport=open("Report.txt", "w")
-
-# Walk the directory structure under root
-# We want the following information for each existing page:
-#   Its title
-#   Its canonical name
-#   Its tags
-#   Its Links (a list of the exact link text for each link)
-#   If it is a redirect, the exact text of the redirect page name
-# This will be stored as a dictionary indexed by the page's cannonical name
-# The value will be a tuple: (Title, CanName, Tags, list of Links, Redirect)
-
-# Note that each page has *four* components in the site image on disk:
-#   <name>.txt -- the source text
-#   <name>.xml -- xml containing (among other things) the tags
-#   <name>.html> -- the html generated by Wikidot from the source
-#   <name> as a directory -- if there are attached files, a directory named <name> containing the files
-
-site={}
-LoadDirectory(site, root)
-
-# Now we have a complete map of the links in site.  All the page names are "raw" -- as they were in the wiki.  None have been canonicized.
-# The map lists the links *leaving* each page.  We want to generate the inverted map showing the links *in* to each page.
-
 #-----------------------------------
 def AddLink(inverseSite, link, name):
     if link in inverseSite:
@@ -154,31 +42,6 @@ def AddLink(inverseSite, link, name):
     else:
         inverseSite[link]=[name]
 #-----------------------------------
-
-
-# InverseSite is a dictionary of all outgoing links in the site (existing or not) in their exact form.  Each contains a list of the pages that name it.
-inverseSite={}
-for (key, val) in site.items():
-    if val.Links is not None:
-        for link in val.Links:
-            AddLink(inverseSite, link, key)
-    else:
-        if val.Redirect is not None:
-            AddLink(inverseSite, val.Redirect, key)
-
-# The main issue we're looking at is the Wikimedia canoniczation. Wikimedia does a much weaker canonization than does Wikidot, so links which
-# Wikidot interprets correctly will be routed to non-existant pages by Wikimedia.
-# We want inverseKeys to be sorted so that all pages that Wikidot sees as the same are sorted together.
-# Within a group of pages which are Wikidot-identical, we want to sort in order by their Wikimedia canonical forms.
-# Within each smaller group, we'll sort by the actual link text
-# We'll then list all links that are used in Wikidot which map to different Wikimedia pages.
-inverseKeys=list(inverseSite.keys())
-inverseKeys.sort(key=lambda elem: elem)
-inverseKeys.sort(key=lambda elem: MediawikiCanonicize(elem))
-inverseKeys.sort(key=lambda elem: WikidotHelpers.Cannonicize(elem))
-
-
-#-----------------------------------
 def tempPrint(line, f):
     try:
         print(line, file=f)
@@ -187,8 +50,10 @@ def tempPrint(line, f):
         print(line.encode("UTF-8"), file=f)
 #-----------------------------------
 def FormatPageList(inverseSite, key):
+    return FormatPages(inverseSite[key])
+#-----------------------------------
+def FormatPages(pages):
     maxPages=4
-    pages=inverseSite[key]
     line=""
     for i in range(0, min(maxPages, len(pages))):
         if i > 0:
@@ -199,130 +64,440 @@ def FormatPageList(inverseSite, key):
     return line
 # -----------------------------------
 def PrintPageList(f, inverseSite, key):
-    tempPrint(FormatPageList(inverseKeys, key), f)
+    tempPrint(FormatPageList(inverseSite, key), f)
 # -----------------------------------
 
 
-# Generate a report on all pages where there are linkage problems
-fileMultiple=open("Pages with multiple linking forms.txt", "w")
-fileDump=open("Dump of process output.txt", "w")
+#==================================================================
+# Build the inverted map showing the links *in* to each page
+# InverseSite is a dictionary of all outgoing links in the site (existing or not) in their exact form.  Each contains a list of the pages that name it.
+@Metrics.Timed("BuildInverseSite")
+def BuildInverseSite(site):
+    inverseSite={}
+    for (key, val) in site.items():
+        if val.Links is not None:
+            for link in val.Links:
+                AddLink(inverseSite, link, key)
+        else:
+            if val.Redirect is not None:
+                AddLink(inverseSite, val.Redirect, key)
+    return inverseSite
+
 
+#==================================================================
+# The main issue we're looking at is the Wikimedia canoniczation. Wikimedia does a much weaker canonization than does Wikidot, so links which
+# Wikidot interprets correctly will be routed to non-existant pages by Wikimedia.
+# We want the links to be sorted so that all pages that Wikidot sees as the same are sorted together.
+# Within a group of pages which are Wikidot-identical, we want to sort in order by their Wikimedia canonical forms.
+# Within each smaller group, we'll sort by the actual link text
+# We'll then list all links that are used in Wikidot which map to different Wikimedia pages.
+# (LinkGroups computes each link's canonical forms once, sorts once on all three keys, and then streams out the groups.)
+#
 # We're going to group on three levels:
 #   Wikidot Cannonical From
 #       Wikimedia Canonical Form
 #           Actual linkage
 # We only want to print when a single Wikidot Canonical Form has more than one Mediawiki Canonical Forms.  Then we want to list the actual linkages separately
-outerKey="nonsense"
-innerKey="random string"
-savedLinesArray=[]
-savedLine=""
-count=0
-for key in inverseKeys:
-    tempPrint("\nnew key="+key, fileDump)
-    # Is this the first record of a new Wikidot canonical name (outer key)?
-    if WikidotHelpers.Cannonicize(outerKey) != WikidotHelpers.Cannonicize(key): # The outer key changes only when it's Wikidot Canonical form changes
-        tempPrint("outer key changed from  "+WikidotHelpers.Cannonicize(outerKey)+"  to  "+WikidotHelpers.Cannonicize(key), fileDump)
-
-        # If there were two or more inner keys in the previous outer key, print them
-        if len(savedLinesArray) > 0 and len(savedLine) > 0:
-            count+=1
-            savedLinesArray.append(savedLine)
-            tempPrint("len(savedLinesArray)="+str(len(savedLinesArray)), fileDump)
-            tempPrint("\n"+outerKey, fileMultiple)
-            for l in savedLinesArray:
-                tempPrint(l, fileMultiple)
-                tempPrint("    "+l, fileDump)
-
-        # Now deal with the new outer key
-        outerKey=key
-        innerKey=key
-        savedLinesArray=[]
-        savedLine=""
-
-        # And save the line for this record.
-        savedLine="'"+key+"' <=== "+FormatPageList(inverseSite, key)
-        tempPrint("saved: "+FormatPageList(inverseSite, key), fileDump)
-        continue
-
-    # The outer key has not changed.  Is the inner key the same, also?
-    if MediawikiCanonicize(innerKey) == MediawikiCanonicize(key):   # The inner key changes  when it's Mediawiki Canonical form changes
-        tempPrint("innerKey same:  "+MediawikiCanonicize(innerKey)+"   Saved: "+FormatPageList(inverseSite, key), fileDump)
-        savedLine=savedLine+FormatPageList(inverseSite, key)
-        continue
-
-    # Outer key has not changed, but the inner key is different.  Save the saved lines and go again
-    tempPrint("innerKey changed from "+MediawikiCanonicize(innerKey)+"  to  "+MediawikiCanonicize(key), fileDump)
-    savedLinesArray.append(savedLine)
-
-    savedLine="'"+key+"' <=== "+FormatPageList(inverseSite, key)  # Begin a new list of lines
-    tempPrint("saved: "+FormatPageList(inverseSite, key), fileDump)
-    innerKey=key
-
-print("Keys with multiple formats:  "+str(count))
-print("Keys with multiple formats:  "+str(count), file=fileReport)
-fileMultiple.close()
-
-
-# Next, we do an analysis of redirects and make a list of all redirects where the target link is all lower case. (These are probably wrong.)
-fileLowerRedirects=open("Redirects Which Are Lowercase.txt", "w")
-count=0
-for (key, val) in site.items():
-    if val.Redirect is not None:
-        if val.Redirect == val.Redirect.lower() and not val.Redirect.isdigit():
-            tempPrint(key+"  ==>  "+val.Redirect, fileLowerRedirects)
-            count+=1
-
-print("Lowercase redirects:  "+str(count))
-print("Lowercase redirects:  "+str(count), file=fileReport)
-fileLowerRedirects.close()
-
-
-# Generate a list of double redirects
-fileDoubleRedirects=open("Double Redirects.txt", "w")
-count=0
-for (key, val) in site.items():
-    if val.Redirect is not None:
-        pageT=val.Title
-        pageCR=WikidotHelpers.Cannonicize(val.Redirect)
-        if pageCR not in site.keys():
-            continue
-        if site[pageCR].Redirect is not None:
-            pageRT=site[pageCR].Title
-            pageRCR=WikidotHelpers.Cannonicize(site[pageCR].Redirect)
-            if pageRCR not in site.keys():
-                tempPrint(pageT+"  ==>  "+pageRT+"  ==>  (missing) "+pageRCR, fileDoubleRedirects)
-                count+=1
-                continue
-            pageRRT=site[pageRCR].Title
-            tempPrint(pageT+"  ==>  "+pageRT+"  ==>  "+pageRRT, fileDoubleRedirects)
-            if site[pageRCR].Redirect is not None:
-                pageRRT=site[pageRCR].Title
-                pageRRCR=WikidotHelpers.Cannonicize(site[pageRCR].Redirect)
-                if pageRRCR not in site.keys():
-                    tempPrint(pageT+"  ==>  "+pageRT+"  ==>  "+pageRRT+"  ==>  (missing) "+pageRRCR, fileDoubleRedirects)
-                    count+=1
-                    continue
-                pageRRRT=site[pageRRCR].Title
-                tempPrint(pageT+"  ==>  "+pageRT+"  ==>  "+pageRRT+"  ==>  "+pageRRCR, fileDoubleRedirects)
-                count+=1
-
-print("Double redirects:  "+str(count))
-print("Double redirects:  "+str(count), file=fileReport)
-fileDoubleRedirects.close()
+# Returns the number of Wikidot forms listed.  If fileDump is given, a trace of all the groups is written to it.
+# (LinkGroups.MultipleFormGroups(LinkGroups.GroupLinks(inverseSite)) gives the groups themselves.)
+# The Report functions each run their report's pass (see MultipleFormsPass, etc., below) on its own.
+def ReportMultipleForms(inverseSite, fileMultiple, fileDump=None):
+    return WriteMultipleForms(LinkGroups.GroupLinks(inverseSite), fileMultiple, fileDump)
+
+# The same, for a stream of groups from LinkGroups.GroupLinks or ExternalSort.GroupLinksExternal
+@Metrics.Timed("ReportMultipleForms")
+def WriteMultipleForms(groups, fileMultiple, fileDump=None):
+    return RunPass(MultipleFormsPass, ReportPasses.SiteIndex({}, groups=lambda: groups), fileMultiple, fileDump)
+
+# The lines of the debug dump for one Wikidot group
+def FormatGroupDump(group):
+    lines=["\nWikidot form: "+group.Wikidot]
+    for form in group.Forms:
+        lines.append("  Mediawiki form: "+form.Mediawiki)
+        for link in form.Links:
+            lines.append("    '"+link.Raw+"' <=== "+FormatPages(link.Pages))
+    return lines
+
+# The lines of the report for one Wikidot group: the first link text, then a line for each Mediawiki form
+def FormatMultipleForms(group):
+    lines=[group.Forms[0].Links[0].Raw]
+    for form in group.Forms:
+        # One line for each Mediawiki form: the first link text with that form, followed by the pages using each of the link texts
+        first=form.Links[0]
+        lines.append("'"+first.Raw+"' <=== "+"".join(FormatPages(link.Pages) for link in form.Links))
+    return lines
+
+
+#==================================================================
+# Make a list of all redirects where the target link is all lower case. (These are probably wrong.)
+# LowercaseRedirects() returns a list of (page, redirect) pairs; ReportLowercaseRedirects() writes them to f and returns the number written
+def LowercaseRedirects(site):
+    return [(key, val.Redirect) for (key, val) in site.items() if IsLowercaseRedirect(val.Redirect)]
+
+# Is a redirect's target (None if the page isn't a redirect) all lower case?
+def IsLowercaseRedirect(redirect):
+    return redirect is not None and redirect == redirect.lower() and not redirect.isdigit()
+
+@Metrics.Timed("ReportLowercaseRedirects")
+def ReportLowercaseRedirects(site, f):
+    return RunPass(LowercaseRedirectsPass, ReportPasses.SiteIndex(site), f)
 
+def FormatLowercaseRedirect(key, redirect):
+    return key+"  ==>  "+redirect
+
+
+#==================================================================
+# Generate a list of double (or longer) redirects
+# Each line shows the titles of the pages along the chain, followed by the missing page or the repeated page if the chain ends in one of those.
+# redirects is the site's RedirectResolver.
+# DoubleRedirects() returns a list of DoubleRedirect tuples; ReportDoubleRedirects() writes them to f and returns the number written
+# (These live in Redirects, so that SiteDatabase can use them without importing this module.)
+DoubleRedirect=Redirects.DoubleRedirect
+DoubleRedirects=Redirects.DoubleRedirects
+DoubleRedirectOf=Redirects.DoubleRedirectOf
+
+@Metrics.Timed("ReportDoubleRedirects")
+def ReportDoubleRedirects(site, redirects, f):
+    return RunPass(DoubleRedirectsPass, ReportPasses.SiteIndex(site, redirects=redirects), f)
+
+def FormatDoubleRedirect(site, d):
+    line="  ==>  ".join(site[k].Title for k in d.Chain)
+    if d.Status == Redirects.Missing:
+        line+="  ==>  (missing) "+d.End
+    elif d.Status == Redirects.Cycle:
+        line+="  ==>  (cycle) "+site[d.End].Title
+    return line
+
+
+#==================================================================
 # Generate  a list of redirects with missing targets
-fileMissingRedirect=open("Missing Redirect Target.txt", "w")
-count=0
-for (key, val) in site.items():
-    if val.Redirect is not None:
-        pageT=val.Title
-        pageCR=WikidotHelpers.Cannonicize(val.Redirect)
-        if pageCR not in site.keys():
-            tempPrint(pageT+"  ==>  "+pageCR, fileMissingRedirect)
-            count+=1
-
-print("Missing redirect targets:  "+str(count))
-print("Missing redirect targets:  "+str(count), file=fileReport)
-fileMissingRedirect.close()
-
-fileReport.close()
\ No newline at end of file
+# redirects is the site's RedirectResolver.
+# MissingRedirectTargets() returns a list of (page, missing target) pairs; ReportMissingRedirectTargets() writes them to f and returns the number written
+MissingRedirectTargets=Redirects.MissingRedirectTargets
+
+@Metrics.Timed("ReportMissingRedirectTargets")
+def ReportMissingRedirectTargets(site, redirects, f):
+    return RunPass(MissingRedirectTargetsPass, ReportPasses.SiteIndex(site, redirects=redirects), f)
+
+def FormatMissingRedirectTarget(site, key, target):
+    return site[key].Title+"  ==>  "+target
+
+
+#==================================================================
+# List the broken links which are probably misspellings of existing pages (see LinkSpelling)
+# Each line shows the link, the title of the page it probably means, how far it is from that page's name, and the pages using the link.
+# inverseSite is the site's inverse link map.  Returns the number of links listed.
+@Metrics.Timed("ReportMisspelledLinks")
+def ReportMisspelledLinks(site, inverseSite, f):
+    return RunPass(MisspelledLinksPass, ReportPasses.SiteIndex(site, inverseSite, groups=lambda: LinkGroups.GroupLinks(inverseSite)), f)
+
+def FormatMisspelledLink(site, m):
+    if m.Distance == 0:
+        how="differs only in accents, case or markup"
+    else:
+        how=str(m.Distance)+(" edit" if m.Distance == 1 else " edits")
+    return "'"+m.Link+"'  ==>  "+(site[m.Target].Title or m.Target)+"  ("+how+")  <=== "+FormatPages(m.Pages)
+
+
+#==================================================================
+# A loaded site, together with the structures derived from it which the reports use.
+# The inverse link map and the redirect resolution are built the first time they are needed and then reused, so any number of reports (or other
+# queries) can be run against one loaded site without reloading it.
+# If memoryBudget (in bytes) is given, the links are grouped by ExternalSort instead, sorting them on disk in runs of about that size rather than
+# building inverseSite and sorting it in memory.  tempDir is where the runs go (by default, the system's temporary directory).
+# That bounds the memory used by the links, but not by the site: the site itself is still loaded in full, since the redirect and misspelling
+# reports look pages up in it.  (A caller which needs only the groups can stream the pages straight from SiteLoader.LoadPagesPipelined into
+# ExternalSort.GroupLinksExternal without keeping them.)
+class SiteAnalysis:
+    def __init__(self, site, memoryBudget=None, tempDir=None):
+        self.site=site
+        self.memoryBudget=memoryBudget
+        self.tempDir=tempDir
+        self._inverseSite=None
+        self._redirects=None
+
+    # -----------------------------------
+    # Load a site directory.  workers and cache are as for SiteLoader.LoadDirectory.
+    @classmethod
+    def FromDirectory(cls, root, workers=1, cache=None, memoryBudget=None, tempDir=None):
+        site={}
+        LoadDirectory(site, root, workers, cache)
+        return cls(site, memoryBudget, tempDir)
+
+    # Load a zipped Wikidot backup.  workers is as for SiteLoader.LoadDirectory.
+    @classmethod
+    def FromZip(cls, pathname, workers=1, memoryBudget=None, tempDir=None):
+        site={}
+        ZipSite.LoadZip(site, pathname, workers)
+        return cls(site, memoryBudget, tempDir)
+
+    # -----------------------------------
+    @property
+    def InverseSite(self):
+        if self._inverseSite is None:
+            self._inverseSite=BuildInverseSite(self.site)
+        return self._inverseSite
+
+    @property
+    def Redirects(self):
+        if self._redirects is None:
+            self._redirects=Redirects.RedirectResolver(self.site)
+        return self._redirects
+
+    # The three-level groups of all the links (see LinkGroups)
+    def Groups(self):
+        if self.memoryBudget is not None:
+            return ExternalSort.GroupLinksExternal(self.site.items(), self.memoryBudget, self.tempDir)
+        return LinkGroups.GroupLinks(self.InverseSite)
+
+    # -----------------------------------
+    # The data behind each of the reports
+    def MultipleForms(self):
+        return LinkGroups.MultipleFormGroups(self.Groups())
+
+    def LowercaseRedirects(self):
+        return LowercaseRedirects(self.site)
+
+    def DoubleRedirects(self):
+        return DoubleRedirects(self.site, self.Redirects)
+
+    def MissingRedirectTargets(self):
+        return MissingRedirectTargets(self.site, self.Redirects)
+
+    def MisspelledLinks(self):
+        return LinkSpelling.MisspellingsInGroups(self.site, self.Groups())
+
+    # -----------------------------------
+    # The read-only index for report passes with the given needs (see ReportPasses.PassNeeds).  Everything they need is built now, so that the
+    # passes, which may run on several threads, only ever read it.
+    def Index(self, needs):
+        inverseSite=None
+        if "inverseSite" in needs or (ReportPasses.Groups in needs and self.memoryBudget is None):
+            inverseSite=self.InverseSite
+        redirects=self.Redirects if "redirects" in needs else None
+        return ReportPasses.SiteIndex(self.site, inverseSite, redirects, self.Groups)
+
+
+#==================================================================
+# The reports, as passes over the site's index (see ReportPasses)
+# The three redirect reports and any others which look at one page at a time share a single scan of the site.
+
+class MultipleFormsPass(ReportPasses.ReportPass):
+    Filename="Pages with multiple linking forms.txt"
+    Stream=ReportPasses.Groups
+    groups=0
+
+    def AddGroup(self, group):
+        if self.dump is not None:
+            for line in FormatGroupDump(group):
+                self.dump.Write(line)
+        if len(group.Forms) > 1:
+            lines=FormatMultipleForms(group)
+            self.sink.Write("\n"+lines[0])
+            for line in lines[1:]:
+                self.sink.Write(line)
+            self.groups+=1
+
+    def Finish(self):
+        return [("Keys with multiple formats", self.groups)]
+
+class LowercaseRedirectsPass(ReportPasses.ReportPass):
+    Filename="Redirects Which Are Lowercase.txt"
+    Stream=ReportPasses.Pages
+
+    def AddPage(self, key, val):
+        if IsLowercaseRedirect(val.Redirect):
+            self.sink.Write(FormatLowercaseRedirect(key, val.Redirect))
+
+    def Finish(self):
+        return [("Lowercase redirects", self.sink.count)]
+
+class DoubleRedirectsPass(ReportPasses.ReportPass):
+    Filename="Double Redirects.txt"
+    Stream=ReportPasses.Pages
+    Needs=("redirects",)
+    cycles=0
+
+    def AddPage(self, key, val):
+        if val.Redirect is None:
+            return
+        d=DoubleRedirectOf(self.index.Redirects, key)
+        if d is not None:
+            self.sink.Write(FormatDoubleRedirect(self.index.Site, d))
+            if d.Status == Redirects.Cycle:
+                self.cycles+=1
+
+    def Finish(self):
+        return [("Double redirects", self.sink.count), ("Redirects in or leading into cycles", self.cycles)]
+
+class MissingRedirectTargetsPass(ReportPasses.ReportPass):
+    Filename="Missing Redirect Target.txt"
+    Stream=ReportPasses.Pages
+    Needs=("redirects",)
+
+    def AddPage(self, key, val):
+        if val.Redirect is None:
+            return
+        target=self.index.Redirects.Target(key)
+        if target not in self.index.Site:
+            self.sink.Write(FormatMissingRedirectTarget(self.index.Site, key, target))
+
+    def Finish(self):
+        return [("Missing redirect targets", self.sink.count)]
+
+# This one reads the groups too, so with the on-disk sort (see SiteAnalysis) it doesn't need inverseSite either
+class MisspelledLinksPass(ReportPasses.ReportPass):
+    Filename="Probable Misspelled Links.txt"
+    Stream=ReportPasses.Groups
+
+    def __init__(self, index, sink, dump=None):
+        super().__init__(index, sink, dump)
+        self.finder=LinkSpelling.MisspellingFinder(index.Site)
+
+    def AddGroup(self, group):
+        for m in self.finder.Misspellings(group):
+            self.sink.Write(FormatMisspelledLink(self.index.Site, m))
+
+    def Finish(self):
+        return [("Probable misspelled links", self.sink.count)]
+
+# The reports which can be run, by name
+Reports=collections.OrderedDict([
+    ("multiple", MultipleFormsPass),
+    ("lowercase", LowercaseRedirectsPass),
+    ("double", DoubleRedirectsPass),
+    ("missing", MissingRedirectTargetsPass),
+    ("misspelled", MisspelledLinksPass),
+])
+
+
+# -----------------------------------
+# Run one report's pass on its own over index, writing the report to f (and the dump, if any, to fileDump).  Returns the pass's first count.
+def RunPass(passClass, index, f, fileDump=None):
+    sink=ReportPasses.ReportSink(f)
+    dumpSink=ReportPasses.ReportSink(fileDump) if fileDump is not None else None
+    summary=ReportPasses.RunPasses(index, [passClass(index, sink, dumpSink)])
+    sink.Flush()
+    if dumpSink is not None:
+        dumpSink.Flush()
+    return summary[0][1]
+
+
+#==================================================================
+# Run the selected reports (by default, all of them) on an analysis, writing them and Report.txt (the summary) into outputDir
+# If dump is true, the trace of the link grouping is written to "Dump of process output.txt".  If concurrent is true, the passes' scans run on
+# threads of their own.
+# Returns a list of the (label, count) summary lines.
+def RunReports(analysis, outputDir=".", reports=None, dump=False, concurrent=False):
+    if reports is None:
+        reports=list(Reports.keys())
+    os.makedirs(outputDir, exist_ok=True)
+    passClasses=[Reports[name] for name in reports]
+    index=analysis.Index(ReportPasses.PassNeeds(passClasses))
+
+    files=[]
+    try:
+        def Sink(filename):
+            f=open(os.path.join(outputDir, filename), "w")
+            files.append(f)
+            return ReportPasses.ReportSink(f)
+        dumpSink=Sink("Dump of process output.txt") if dump else None
+        passes=[cls(index, Sink(cls.Filename), dumpSink) for cls in passClasses]
+        summary=ReportPasses.RunPasses(index, passes, concurrent)
+        for p in passes:
+            p.sink.Flush()
+        if dumpSink is not None:
+            dumpSink.Flush()
+    finally:
+        for f in files:
+            f.close()
+
+    with open(os.path.join(outputDir, "Report.txt"), "w") as fileReport:
+        for label, count in summary:
+            print(label+":  "+str(count))
+            print(label+":  "+str(count), file=fileReport)
+    return summary
+
+
+# *****************************************************************
+# *****************************************************************
+# Main
+# (The guard keeps the worker processes used by the parallel loader from re-running the whole analysis when they import this module.)
+def main(argv=None):
+    global log
+
+    parser=argparse.ArgumentParser(description="Analyze the links and redirects in a Wikidot site image")
+    parser.add_argument("root", help="the site directory, or a zipped Wikidot backup")
+    parser.add_argument("--output", default=".", help="the directory the reports are written to")
+    parser.add_argument("--reports", nargs="+", choices=list(Reports.keys()), help="the reports to run (default: all)")
+    parser.add_argument("--workers", type=int, default=0, help="processes used to load the pages: 1 loads them serially; 0 (the default) uses one per CPU")
+    parser.add_argument("--cache", default="PageCache.pickle",
+                        help="the file parsed pages are cached in, so unchanged pages aren't re-parsed on the next run (relative to the output directory)")
+    parser.add_argument("--no-cache", dest="cache", action="store_const", const=None, help="don't use the page cache")
+    parser.add_argument("--metrics", default="Metrics.json", help="the file the timings and counts are written to")
+    parser.add_argument("--profile", metavar="PHASE", help="profile this phase (e.g., LoadDirectory) with cProfile; the profile goes to profile.pstats")
+    parser.add_argument("--dump", action="store_true", help="also write the debug dump of the link grouping")
+    parser.add_argument("--concurrent", action="store_true", help="run the reports' scans of the site on separate threads")
+    parser.add_argument("--memory-budget", dest="memoryBudget", type=float, metavar="MB",
+                        help="group the links by sorting them on disk, in runs of about this many megabytes, instead of in memory (the site itself is still loaded in full)")
+    parser.add_argument("--temp", help="the directory for the on-disk sort's run files")
+    parser.add_argument("--database", help="also save the site in this SQLite database, for querying with SiteDatabase.py")
+    args=parser.parse_args(argv)
+    isZip=ZipSite.IsZipSite(args.root)
+    if not isZip and not os.path.isdir(args.root):
+        parser.error("'"+args.root+"' is neither a site directory nor a zipped Wikidot backup")
+
+    os.makedirs(args.output, exist_ok=True)
+    log=open(os.path.join(args.output, "log.txt"), "w")
+    Metrics.metrics.profilePhase=args.profile
+    Metrics.metrics.profileFile=os.path.join(args.output, "profile.pstats")
+
+    # Walk the directory structure under root
+    # We want the following information for each existing page:
+    #   Its title
+    #   Its canonical name
+    #   Its tags
+    #   Its Links (a list of the exact link text for each link)
+    #   If it is a redirect, the exact text of the redirect page name
+    # This will be stored as a dictionary indexed by the page's cannonical name
+    # The value will be a tuple: (Title, CanName, Tags, list of Links, Redirect)
+
+    # Note that each page has *four* components in the site image on disk:
+    #   <name>.txt -- the source text
+    #   <name>.xml -- xml containing (among other things) the tags
+    #   <name>.html> -- the html generated by Wikidot from the source
+    #   <name> as a directory -- if there are attached files, a directory named <name> containing the files
+    # A zipped backup is read directly, without extracting it.  (The page cache only works for a site directory.)
+    cache=None
+    memoryBudget=int(args.memoryBudget*1024*1024) if args.memoryBudget is not None else None
+    if isZip:
+        try:
+            analysis=SiteAnalysis.FromZip(args.root, args.workers, memoryBudget, args.temp)
+        except ValueError as e:     # There are no pages in it
+            parser.error(str(e))
+    else:
+        cache=PageCache.PageCache(os.path.join(args.output, args.cache)) if args.cache is not None else None
+        analysis=SiteAnalysis.FromDirectory(args.root, args.workers, cache, memoryBudget, args.temp)
+    if cache is not None:
+        cache.Prune()   # Forget pages which have been deleted
+        cache.Save()
+
+    # Now we have a complete map of the links in site.  All the page names are "raw" -- as they were in the wiki.  None have been canonicized.
+    RunReports(analysis, args.output, args.reports, args.dump, args.concurrent)
+    if args.database is not None:
+        SiteDatabase.SiteDatabase.Build(args.database, analysis.site).Close()
+
+    # Record the cache statistics and save the metrics
+    if analysis._inverseSite is not None:     # (Only if the reports built it: with the on-disk sort, the distinct links are never all in memory)
+        Metrics.metrics.Set("distinctLinks", len(analysis._inverseSite))
+    if cache is not None:
+        Metrics.metrics.Set("pageCacheHits", cache.Hits)
+        Metrics.metrics.Set("pageCacheMisses", cache.Misses)
+    Metrics.metrics.Set("canonicalizationCache", WikidotHelpers.canonCache.Stats())
+    Metrics.metrics.Save(os.path.join(args.output, args.metrics))
+    log.close()
+    log=None
+
+
+if __name__ == "__main__":
+    main()
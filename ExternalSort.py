@@ -0,0 +1,136 @@
+import os
+import heapq
+import pickle
+import tempfile
+import itertools
+import WikidotHelpers
+import LinkGroups
+import Metrics
+
+# Group the links of a site by their canonical forms (as LinkGroups.GroupLinks does) without holding all the links in memory at once
+#
+# The pages are read as a stream of (page name, PageInfo) pairs: site.items(), or the output of SiteLoader.LoadPagesPipelined, so that not
+# even the site need be kept.  (CaseAnalysis passes site.items(), since its other reports need the site anyway; then only the memory used by the
+# links is bounded.)  Their links are collected, as in inverseSite, into a map of raw link -> the pages using it, until that reaches the
+# memory budget.  (As in inverseSite, a redirect page counts as linking to its destination.)  Then each raw link is turned into a
+# (Wikidot form, Mediawiki form, raw link, sequence number of its first page, pages) record, and the batch is sorted and spilled to a run file
+# on disk.  Finally the runs are k-way merged (in several passes if there are more than maxFanIn of them), the records for the same raw link
+# from different runs are joined, and the merged stream is grouped into the same three-level groups as the in-memory path gives.
+#
+# The page sequence number is the page's position in the stream.  Each run holds a contiguous stretch of pages, so sorting on it puts a raw
+# link's records from different runs in page order.  Thus the pages using each raw link come out in the same order as in inverseSite, and the
+# groups are identical to those from LinkGroups.GroupLinks(BuildInverseSite(site)).
+
+DefaultMemoryBudget=256*1024*1024
+DefaultMaxFanIn=64
+
+_recordOverhead=400     # Roughly the bytes a record's tuple, list and string objects take, apart from the characters themselves
+_pageOverhead=60        # Likewise, for each page
+
+
+# *****************************************************************
+# Generate the groups (LinkGroups.WikidotGroup) for the links on the pages in the stream
+def GroupLinksExternal(pages, memoryBudget=DefaultMemoryBudget, tempDir=None, maxFanIn=DefaultMaxFanIn):
+    records=SortedLinkRecords(pages, memoryBudget, tempDir, maxFanIn)
+    return LinkGroups.GroupSortedRecords(_JoinRecords(records))
+
+# Join up the records for the same raw link from different runs
+def _JoinRecords(records):
+    for (w, m, r), recs in itertools.groupby(records, key=lambda rec: rec[:3]):
+        first=next(recs)
+        pages=list(first[4])
+        for rec in recs:
+            pages.extend(rec[4])
+        yield w, m, r, pages
+
+
+# *****************************************************************
+# Generate the sorted (Wikidot form, Mediawiki form, raw link, first page's sequence number, pages) records for the links on the pages in the
+# stream.  (There may be several records for one raw link, one from each run.)
+# The run files are kept in a temporary directory (in tempDir, if given) which is removed when the generator finishes or is closed.
+def SortedLinkRecords(pages, memoryBudget=DefaultMemoryBudget, tempDir=None, maxFanIn=DefaultMaxFanIn):
+    # Size the chunks the run files are read in so that the chunks being merged fit in the budget, too
+    chunkRecords=max(16, min(4096, memoryBudget//(maxFanIn*(_recordOverhead+100))))
+    with tempfile.TemporaryDirectory(prefix="CaseAnalysisSort", dir=tempDir) as runDir:
+        runs=[]
+        buffer={}       # Raw link -> (sequence number of the first page using it, the list of pages using it)
+        size=0
+        for seq, (name, pageInfo) in enumerate(pages):
+            if pageInfo.Links is not None:
+                links=pageInfo.Links
+            elif pageInfo.Redirect is not None:
+                links=(pageInfo.Redirect,)
+            else:
+                continue
+            for link in links:
+                entry=buffer.get(link)
+                if entry is None:
+                    buffer[link]=(seq, [name])
+                    size+=_recordOverhead+3*len(link)
+                else:
+                    entry[1].append(name)
+                size+=8
+            size+=_pageOverhead+len(name)
+            if size >= memoryBudget:
+                runs.append(_WriteRun(runDir, len(runs), _SortBuffer(buffer), chunkRecords))
+                buffer={}
+                size=0
+
+        # If everything fit in memory, there's no need to go to disk at all
+        if len(runs) == 0:
+            yield from _SortBuffer(buffer)
+            return
+        if len(buffer) > 0:
+            runs.append(_WriteRun(runDir, len(runs), _SortBuffer(buffer), chunkRecords))
+        del buffer
+
+        # Merge the runs down until there are few enough to merge in one go
+        count=len(runs)
+        while len(runs) > maxFanIn:
+            merged=[]
+            for i in range(0, len(runs), maxFanIn):
+                group=runs[i:i+maxFanIn]
+                with Metrics.metrics.Phase("MergeRuns"):
+                    merged.append(_WriteRun(runDir, count, heapq.merge(*[_ReadRun(r) for r in group]), chunkRecords))
+                count+=1
+                for r in group:
+                    os.remove(r)
+            runs=merged
+
+        yield from heapq.merge(*[_ReadRun(r) for r in runs])
+
+
+# -----------------------------------
+# Canonicize and sort a buffer of links
+def _SortBuffer(buffer):
+    with Metrics.metrics.Phase("CanonicizeLinks"):
+        raws=list(buffer)
+        records=[(w, m, raw)+buffer[raw] for raw, w, m in zip(raws, WikidotHelpers.CannonicizeBatch(raws), map(WikidotHelpers.MediawikiCanonicizeFast, raws))]
+    with Metrics.metrics.Phase("SortLinks"):
+        records.sort()
+    return records
+
+# -----------------------------------
+# Write a sorted stream of records to a run file, returning its pathname
+def _WriteRun(runDir, number, records, chunkRecords):
+    pathname=os.path.join(runDir, "run"+str(number))
+    with Metrics.metrics.Phase("WriteRuns"), open(pathname, "wb") as f:
+        records=iter(records)
+        while True:
+            chunk=list(itertools.islice(records, chunkRecords))
+            if len(chunk) == 0:
+                break
+            pickle.dump(chunk, f, pickle.HIGHEST_PROTOCOL)
+    Metrics.metrics.Count("sortRuns")
+    return pathname
+
+# -----------------------------------
+# Generate the records in a run file
+def _ReadRun(pathname):
+    with open(pathname, "rb") as f:
+        while True:
+            try:
+                chunk=pickle.load(f)
+            except EOFError:
+                return
+            yield from chunk
@@ -0,0 +1,194 @@
+import sys
+from array import array
+import WikidotHelpers
+
+# A compact, read-only store for the link graph of a site.
+#
+# The site dictionary holds a PageInfo namedtuple per page, each with its own set of link strings, and inverseSite holds a list of page name
+# strings per link.  On a large wiki, the duplicated strings and the per-object overhead of all those sets and lists add up.
+#
+# Here every name (page names and link texts alike) is interned once and given an integer ID.  The links are held as CSR-style adjacency
+# arrays of IDs: the links out of name ID i are forwardTargets[forwardOffsets[i]:forwardOffsets[i+1]], and likewise for the links into it.
+# Page metadata is kept in PageRecords (which use __slots__), and the Wikidot and Mediawiki canonical forms of each name are held as IDs
+# into a table of forms, again with CSR arrays to go from a Wikidot form back to all the names which have it.
+#
+# As in inverseSite, a redirect page is treated as linking to its redirect destination.
+
+
+# *****************************************************************
+class PageRecord:
+    __slots__=("Title", "Tags", "Redirect")
+
+    def __init__(self, title, tags, redirect):
+        self.Title=title
+        self.Tags=tags
+        self.Redirect=redirect
+
+
+# *****************************************************************
+# Build CSR arrays from a list of lists of IDs
+def _Csr(lists):
+    offsets=array("i", [0])
+    targets=array("i")
+    for l in lists:
+        targets.extend(l)
+        offsets.append(len(targets))
+    return offsets, targets
+
+
+# *****************************************************************
+class LinkGraph:
+    def __init__(self):
+        self.names=[]           # Indexed by ID
+        self.ids={}             # Name to ID
+        self.pages={}           # ID to PageRecord, for the names which are pages
+        self.forwardOffsets=array("i", [0])
+        self.forwardTargets=array("i")
+        self.reverseOffsets=array("i", [0])
+        self.reverseSources=array("i")
+        self.forms=[]           # The table of canonical forms (both Wikidot and Mediawiki), indexed by form ID
+        self.wikidotForm=array("i")     # Indexed by name ID
+        self.mediawikiForm=array("i")   # Indexed by name ID
+        self.wikidotOffsets=array("i", [0])     # Indexed by form ID: the names with that Wikidot form
+        self.wikidotNames=array("i")
+        self._formIds=None      # Form to form ID.  The form table is small compared to the name table, so we build this lazily.
+
+    # -----------------------------------
+    # Build the graph from a site dictionary of PageInfos
+    @classmethod
+    def FromSite(cls, site):
+        graph=cls()
+        forward=[]
+
+        # Give every page and every link an ID
+        for key, val in site.items():
+            pageId=graph._Intern(key)
+            tags=tuple(val.Tags) if val.Tags is not None else None
+            graph.pages[pageId]=PageRecord(val.Title, tags, val.Redirect)
+            if val.Links is not None:
+                forward.append((pageId, [graph._Intern(link) for link in val.Links]))
+            elif val.Redirect is not None:
+                forward.append((pageId, [graph._Intern(val.Redirect)]))
+
+        # Forward adjacency
+        n=len(graph.names)
+        lists=[[] for i in range(n)]
+        for pageId, targets in forward:
+            lists[pageId]=targets
+        graph.forwardOffsets, graph.forwardTargets=_Csr(lists)
+
+        # Reverse adjacency.  We go through the pages in site order, so the pages linking into a name come out in the same order as in inverseSite.
+        lists=[[] for i in range(n)]
+        for pageId, targets in forward:
+            for t in targets:
+                lists[t].append(pageId)
+        graph.reverseOffsets, graph.reverseSources=_Csr(lists)
+        del lists, forward
+
+        # Canonical forms
+        formIds={}
+        def FormId(form):
+            i=formIds.get(form)
+            if i is None:
+                i=len(graph.forms)
+                formIds[form]=i
+                graph.forms.append(sys.intern(form))
+            return i
+        graph.wikidotForm=array("i", (FormId(f) for f in WikidotHelpers.CannonicizeBatch(graph.names)))
+        graph.mediawikiForm=array("i", (FormId(WikidotHelpers.MediawikiCanonicizeFast(n)) for n in graph.names))
+        lists=[[] for i in range(len(graph.forms))]
+        for nameId, formId in enumerate(graph.wikidotForm):
+            lists[formId].append(nameId)
+        graph.wikidotOffsets, graph.wikidotNames=_Csr(lists)
+        return graph
+
+    # -----------------------------------
+    def _Intern(self, name):
+        i=self.ids.get(name)
+        if i is None:
+            i=len(self.names)
+            name=sys.intern(name)
+            self.ids[name]=i
+            self.names.append(name)
+        return i
+
+    # -----------------------------------
+    # Get the ID of a name, or None if it doesn't appear in the site
+    def Id(self, name):
+        return self.ids.get(name)
+
+    def Name(self, id):
+        return self.names[id]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    # -----------------------------------
+    # Get the PageRecord for a page (None if the name isn't a page in the site)
+    def Page(self, name):
+        i=self.ids.get(name)
+        if i is None:
+            return None
+        return self.pages.get(i)
+
+    # Generate the names of all the pages, in site order
+    def PageNames(self):
+        for i in self.pages:
+            yield self.names[i]
+
+    # -----------------------------------
+    # The names of the pages linked to from name
+    def LinksFrom(self, name):
+        i=self.ids.get(name)
+        if i is None:
+            return []
+        return [self.names[t] for t in self.forwardTargets[self.forwardOffsets[i]:self.forwardOffsets[i+1]]]
+
+    # The names of the pages which link to name
+    def LinksInto(self, name):
+        i=self.ids.get(name)
+        if i is None:
+            return []
+        return [self.names[s] for s in self.reverseSources[self.reverseOffsets[i]:self.reverseOffsets[i+1]]]
+
+    # -----------------------------------
+    # The canonical forms of a name which appears in the site
+    def WikidotForm(self, name):
+        i=self.ids.get(name)
+        if i is None:
+            return None
+        return self.forms[self.wikidotForm[i]]
+
+    def MediawikiForm(self, name):
+        i=self.ids.get(name)
+        if i is None:
+            return None
+        return self.forms[self.mediawikiForm[i]]
+
+    # All the names (page names and link texts) in the site which have a given Wikidot canonical form
+    def NamesWithWikidotForm(self, form):
+        names=[]
+        for f in (form, WikidotHelpers.Cannonicize(form)):  # Allow either the canonical form or any raw name which canonicizes to it
+            i=self._FormId(f)
+            if i is not None and self.wikidotOffsets[i] != self.wikidotOffsets[i+1]:
+                names=[self.names[n] for n in self.wikidotNames[self.wikidotOffsets[i]:self.wikidotOffsets[i+1]]]
+                break
+        return names
+
+    def _FormId(self, form):
+        if self._formIds is None:
+            self._formIds={f: i for i, f in enumerate(self.forms)}
+        return self._formIds.get(form)
+
+    # -----------------------------------
+    # Rebuild an inverseSite-style dictionary (link text -> list of pages linking to it) from the graph
+    def InverseSite(self):
+        inverse={}
+        for i in range(len(self.names)):
+            start, end=self.reverseOffsets[i], self.reverseOffsets[i+1]
+            if start != end:
+                inverse[self.names[i]]=[self.names[s] for s in self.reverseSources[start:end]]
+        return inverse
@@ -0,0 +1,55 @@
+import collections
+import itertools
+import WikidotHelpers
+import Metrics
+
+# Group the links used in a site by their canonical forms.
+#
+# The grouping is on three levels:
+#   Wikidot canonical form
+#       Mediawiki canonical form
+#           Actual link text (and the pages which use it)
+#
+# Each link's two canonical forms are computed exactly once (the Wikidot forms in a batch), the links are sorted once on (Wikidot form, Mediawiki form, raw link),
+# and then the groups are generated one Wikidot group at a time, so consumers can stream through them.
+
+LinkKey=collections.namedtuple("LinkKey", "Wikidot, Mediawiki, Raw")
+RawLink=collections.namedtuple("RawLink", "Raw, Pages")                   # Pages is the list of pages which use this exact link text
+MediawikiGroup=collections.namedtuple("MediawikiGroup", "Mediawiki, Links")  # Links is a list of RawLinks
+WikidotGroup=collections.namedtuple("WikidotGroup", "Wikidot, Forms")        # Forms is a list of MediawikiGroups
+
+
+# *****************************************************************
+# Compute the (Wikidot form, Mediawiki form, raw) key of each link and return the keys sorted
+def SortedLinkKeys(links):
+    links=list(links)
+    with Metrics.metrics.Phase("CanonicizeLinks"):
+        keys=[LinkKey(w, m, r) for w, m, r in zip(WikidotHelpers.CannonicizeBatch(links), map(WikidotHelpers.MediawikiCanonicizeFast, links), links)]
+    with Metrics.metrics.Phase("SortLinks"):
+        keys.sort()
+    return keys
+
+
+# *****************************************************************
+# Generate the three-level groups from a stream of (Wikidot form, Mediawiki form, raw link, pages) records which are already in sorted order
+def GroupSortedRecords(records):
+    for wikidot, wikidotRecords in itertools.groupby(records, key=lambda r: r[0]):
+        forms=[]
+        for mediawiki, mediawikiRecords in itertools.groupby(wikidotRecords, key=lambda r: r[1]):
+            forms.append(MediawikiGroup(mediawiki, [RawLink(r[2], r[3]) for r in mediawikiRecords]))
+        yield WikidotGroup(wikidot, forms)
+
+
+# *****************************************************************
+# Generate the three-level groups for all the links in inverseSite (a dictionary of link text to the list of pages using it)
+def GroupLinks(inverseSite):
+    return GroupSortedRecords((k.Wikidot, k.Mediawiki, k.Raw, inverseSite[k.Raw]) for k in SortedLinkKeys(inverseSite.keys()))
+
+
+# *****************************************************************
+# Generate just the groups where a single Wikidot form is reached using more than one Mediawiki form.
+# (These are the links which work on Wikidot but which would go to different pages on Mediawiki.)
+def MultipleFormGroups(groups):
+    for group in groups:
+        if len(group.Forms) > 1:
+            yield group
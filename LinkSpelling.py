@@ -0,0 +1,250 @@
+import re
+import html
+import itertools
+import collections
+import unicodedata
+import WikidotHelpers
+import LinkGroups
+import Metrics
+
+# Find links which are probably misspellings of the names of existing pages
+#
+# Wikidot's canonicization makes links case-insensitive and ignores punctuation, but it keeps accents ("Färmer" is not "Farmer") and any markup
+# which has crept into the link text, and of course it can do nothing about typos.  So here each broken link (one whose Wikidot form is not a
+# page) is normalized more aggressively (see NormalizeLink) and looked up among the normalized titles and names of the pages:
+#   If it matches one exactly, the link differs from the page only in accents, case or markup
+#   Otherwise, the pages whose normalized names are within a few edits of it are probable targets (a typo, a dropped letter, two letters swapped)
+#
+# Comparing every broken link with every page would be quadratic, so the pages' names are kept in a NameIndex, which maps each trigram (three
+# character substring) of each name, together with the name's length, to the names containing it.  A name within k edits of a link is within k
+# letters of its length and lacks at most 4*k of its distinct trigrams (an edit spoils at most four: swapping two letters touches the four
+# trigrams covering them), so a lookup scans just the link's trigrams' lists for those few lengths, counting how often each name turns up, and
+# computes the edit distance only to the handful of names which turn up often enough.  The lookup doesn't depend on the number of links, and
+# each distinct normalized link is looked up once, so the report's time is linear in the number of links; the cost of a lookup grows only with
+# the number of pages whose names share trigrams with the link.
+
+Misspelling=collections.namedtuple("Misspelling", "Link, Target, Distance, Pages")     # Target is the page key; Distance is 0 for an exact match
+
+
+# *****************************************************************
+# Normalization
+
+_url=re.compile(r"(?:https?|ftp)://\S+", re.IGNORECASE)
+_hyperlink=re.compile(r"\[\*?(?:https?|ftp)://[^\s\[\]]+[ \t]*([^\[\]]*)\]", re.IGNORECASE)    # [http://url display text] -> display text
+_coloredText=re.compile(r"##[^|#]*\|(.*?)##")                                                   # ##color|text## -> text
+_tags=re.compile(r"\[\[/?[^\[\]]*\]\]")                                                         # [[span ...]], [[/span]], etc.
+_inlineMarkup=re.compile(r"\*\*|//|__|--|,,|\^\^|\{\{|\}\}|@@|@<|>@")
+_nonAlphanumeric=re.compile(r"[\W_]+")
+
+# -----------------------------------
+# Strip the Wikidot markup from a link text, leaving just what would be displayed
+def StripMarkup(text):
+    text=_hyperlink.sub(r"\1", text)
+    text=_url.sub(" ", text)
+    text=_coloredText.sub(r"\1", text)
+    text=_tags.sub(" ", text)
+    text=_inlineMarkup.sub("", text)
+    return html.unescape(text)
+
+# -----------------------------------
+# Remove the accents from the letters of a string ("Färmer" -> "Farmer")
+def FoldAccents(text):
+    if text.isascii():
+        return text
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+# -----------------------------------
+# The normalized form of a link text or page name: markup stripped, accents folded, case folded, and each run of anything other than letters and
+# digits turned into a single space
+def NormalizeLink(text):
+    text=FoldAccents(StripMarkup(text)).casefold()
+    return " ".join(_nonAlphanumeric.sub(" ", text).split())
+
+
+# *****************************************************************
+# Edit distance
+
+# -----------------------------------
+# The edit distance between a and b, counting the insertion, deletion or substitution of a character, or the swapping of two adjacent characters,
+# as one edit each.  If it is more than limit, some number greater than limit is returned.
+# Only the band of the table within limit of its diagonal is computed, and the computation stops as soon as a whole row is over the limit.
+def EditDistance(a, b, limit):
+    la=len(a)
+    lb=len(b)
+    if abs(la-lb) > limit:
+        return limit+1
+    big=limit+1
+    prev2=None
+    prev=list(range(lb+1))
+    for i in range(1, la+1):
+        ca=a[i-1]
+        lo=max(1, i-limit)
+        hi=min(lb, i+limit)
+        row=[big]*(lb+1)
+        if lo == 1:
+            row[0]=i
+        best=row[0] if lo == 1 else big
+        for j in range(lo, hi+1):
+            cb=b[j-1]
+            d=prev[j-1] if ca == cb else prev[j-1]+1
+            if prev[j]+1 < d:
+                d=prev[j]+1
+            if row[j-1]+1 < d:
+                d=row[j-1]+1
+            if prev2 is not None and j > 1 and ca == b[j-2] and a[i-2] == cb and prev2[j-2]+1 < d:
+                d=prev2[j-2]+1
+            row[j]=d
+            if d < best:
+                best=d
+        if best > limit:
+            return big
+        prev2=prev
+        prev=row
+    return min(prev[lb], big)
+
+# -----------------------------------
+# The number of edits a (normalized) link may be from a page name and still be taken as a misspelling of it.
+# Short names are only matched exactly: one letter wrong in "Ghod" gives a different word, not a typo.  (Nor can the index look for names
+# more than (number of distinct trigrams-1)/4 edits away -- see NameIndex.Near.)
+def MaxDistance(name):
+    if len(name) < 5:
+        return 0
+    distance=1 if len(name) < 10 else 2
+    return min(distance, (len(set(NameIndex.Trigrams(name)))-1)//4)
+
+
+# *****************************************************************
+# An index of the normalized names of the pages
+class NameIndex:
+    def __init__(self):
+        self.names=[]           # The distinct normalized names
+        self.keys=[]            # The page keys for each name, in the order they were added
+        self.ids={}             # Normalized name -> its position in names
+        self.grams={}           # (Trigram, length of name) -> the list of positions of the names of that length containing it
+
+    # -----------------------------------
+    # The trigrams of a name, padded at each end so that its first and last letters are in as many trigrams as the others
+    @staticmethod
+    def Trigrams(name):
+        padded="\1\1"+name+"\2\2"
+        return [padded[i:i+3] for i in range(len(padded)-2)]
+
+    # -----------------------------------
+    # Add a name for a page
+    def Add(self, name, key):
+        if name == "":
+            return
+        i=self.ids.get(name)
+        if i is not None:
+            if key not in self.keys[i]:
+                self.keys[i].append(key)
+            return
+        i=len(self.names)
+        self.ids[name]=i
+        self.names.append(name)
+        self.keys.append([key])
+        for gram in set(self.Trigrams(name)):
+            self.grams.setdefault((gram, len(name)), []).append(i)
+
+    # -----------------------------------
+    # The page keys for a name which is in the index exactly (None if it isn't)
+    def Exact(self, name):
+        i=self.ids.get(name)
+        return None if i is None else self.keys[i]
+
+    # -----------------------------------
+    # The names within maxDistance edits of name, as a list of (distance, name's position in names) sorted nearest first
+    def Near(self, name, maxDistance):
+        grams=set(self.Trigrams(name))
+        maxDistance=min(maxDistance, (len(grams)-1)//4)     # (There must be enough trigrams to go on)
+        if maxDistance <= 0:
+            return []
+
+        # A name within maxDistance edits is within maxDistance letters of the same length, and lacks at most 4*maxDistance of the distinct
+        # trigrams.  So only the lists for those lengths are scanned, and only the names which turn up in enough of them are candidates.
+        lengths=range(len(name)-maxDistance, len(name)+maxDistance+1)
+        lists=[self.grams[key] for key in ((g, n) for g in grams for n in lengths) if key in self.grams]
+        counts=collections.Counter(itertools.chain.from_iterable(lists))
+        threshold=len(grams)-4*maxDistance
+        candidates=[i for i, count in counts.items() if count >= threshold]
+        Metrics.metrics.Count("spellingCandidates", len(candidates))
+
+        found=[]
+        for i in candidates:
+            d=EditDistance(name, self.names[i], maxDistance)
+            if d <= maxDistance:
+                found.append((d, i))
+        found.sort()
+        return found
+
+
+# -----------------------------------
+# Build the index of the normalized titles and names of the pages in site
+@Metrics.Timed("BuildNameIndex")
+def BuildNameIndex(site):
+    index=NameIndex()
+    for key, val in site.items():
+        if val.Title is not None:
+            index.Add(NormalizeLink(val.Title), key)
+        index.Add(NormalizeLink(key), key)
+    return index
+
+
+# *****************************************************************
+# Find the probable misspellings among the links in inverseSite.  Returns a list of Misspellings, sorted (as LinkGroups sorts the links) by the
+# links' Wikidot forms, then their Mediawiki forms, then the links themselves -- so the report comes out the same on every run.  (inverseSite's
+# own order isn't stable: it depends on the order of the pages' sets of links, which changes with Python's string hashing.)
+# A link can be a misspelling of more than one page; only the nearest (and, of those, the first in the site) is given.
+@Metrics.Timed("FindMisspellings")
+def ProbableMisspellings(site, inverseSite, index=None):
+    return MisspellingsInGroups(site, LinkGroups.GroupLinks(inverseSite), index)
+
+# The same, for a stream of groups from LinkGroups.GroupLinks or ExternalSort.GroupLinksExternal (in the stream's order)
+def MisspellingsInGroups(site, groups, index=None):
+    finder=MisspellingFinder(site, index)
+    misspellings=[]
+    for group in groups:
+        misspellings.extend(finder.Misspellings(group))
+    return misspellings
+
+
+# -----------------------------------
+# Finds the probable misspellings one group of links at a time, so that they can be found in the same pass over the groups as other reports
+class MisspellingFinder:
+    def __init__(self, site, index=None):
+        self.site=site
+        self.index=index if index is not None else BuildNameIndex(site)
+        self.targets={}         # Normalized link -> its nearest page (see _Nearest).  Many broken links have the same normalized form.
+
+    # -----------------------------------
+    # The misspellings among the links of a group (LinkGroups.WikidotGroup).  The links are broken if the group's Wikidot form isn't a page.
+    def Misspellings(self, group):
+        if group.Wikidot in self.site:
+            return []
+        misspellings=[]
+        broken=0
+        for form in group.Forms:
+            for link in form.Links:
+                broken+=1
+                name=NormalizeLink(link.Raw)
+                target=self.targets.get(name, self)
+                if target is self:
+                    target=_Nearest(self.index, name)
+                    self.targets[name]=target
+                if target is not None:
+                    misspellings.append(Misspelling(link.Raw, target[1], target[0], link.Pages))
+        Metrics.metrics.Count("brokenLinks", broken)
+        return misspellings
+
+# The (distance, page key) of the nearest page to a normalized link (None if there's none near enough)
+def _Nearest(index, name):
+    if name == "":
+        return None
+    keys=index.Exact(name)
+    if keys is not None:
+        return 0, keys[0]
+    found=index.Near(name, MaxDistance(name))
+    if len(found) == 0:
+        return None
+    distance, i=found[0]        # (Names are numbered in the order they were added, so this is the first of the nearest in the site)
+    return distance, index.keys[i][0]
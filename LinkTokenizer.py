@@ -0,0 +1,118 @@
+import re
+import collections
+
+# Extract the links from a page's source in a single pass.
+#
+# The scan works entirely with offsets into the source: nothing is sliced off or copied as it goes, so the cost is linear in the size of the page
+# no matter how many links it contains.
+#
+# Each link found is returned as a LinkToken:
+#   Kind    -- one of the kinds below
+#   Target  -- what the link points to (a page name, URL or redirect destination) with leading and trailing whitespace removed
+#   Display -- the display text, if any, else None
+#   Start   -- the offset of the first character of the link markup in the source
+#   End     -- the offset just past the last character of the link markup
+#
+# The kinds of link recognized are:
+#   PageLink     [[[link]]]  or  [[[link|display text]]]
+#   Hyperlink    [http://url display text]  or  [*http://url display text]   (embedded hyperlinks -- only scanned for when asked)
+#   RedirectLink [[module redirect destination="link"]]                       (only scanned for when asked)
+
+LinkToken=collections.namedtuple("LinkToken", "Kind, Target, Display, Start, End")
+
+PageLink="link"
+Hyperlink="hyperlink"
+RedirectLink="redirect"
+
+_hyperlinkPattern=r"\[\*?(?P<url>(?:https?|ftp)://[^\s\[\]]+)(?:[ \t]+(?P<display>[^\[\]\n]*))?\]"
+_redirectPattern=r'\[\[module\s+redirect\s+destination="(?P<dest>[^"]*)"\s*\]\]'
+
+_patterns={}    # Compiled start patterns, keyed by the set of kinds they look for
+
+
+# *****************************************************************
+# Get the compiled pattern which finds the start of any of the requested kinds of link
+def _StartPattern(kinds):
+    key=frozenset(kinds)
+    pattern=_patterns.get(key)
+    if pattern is None:
+        alternatives=[]
+        if RedirectLink in key:     # Must come before the page link alternative, since both begin with "[["
+            alternatives.append("(?P<redirect>"+_redirectPattern+")")
+        if PageLink in key:
+            alternatives.append(r"(?P<link>\[\[\[)")
+        if Hyperlink in key:
+            alternatives.append("(?P<hyperlink>"+_hyperlinkPattern+")")
+        pattern=re.compile("|".join(alternatives), re.IGNORECASE)
+        _patterns[key]=pattern
+    return pattern
+
+
+# *****************************************************************
+# Generate the LinkTokens in source, in the order in which they appear
+# kinds is the collection of kinds of link to look for.  By default only page links are found.
+def Tokenize(source, kinds=(PageLink,)):
+    if PageLink in kinds and len(kinds) == 1:
+        yield from _TokenizePageLinks(source)
+        return
+
+    pattern=_StartPattern(kinds)
+    pos=0
+    unclosed=False      # Set once we've seen a "[[[" with no "]]]" after it.  After that there can be no more page links.
+    while True:
+        m=pattern.search(source, pos)
+        if m is None:
+            return
+
+        if m.lastgroup == "link":
+            if unclosed:
+                pos=m.end()
+                continue
+            loc2=source.find("]]]", m.end())
+            if loc2 == -1:
+                unclosed=True
+                pos=m.end()
+                continue
+            yield _PageLinkToken(source, m.start(), loc2)
+            pos=loc2+3
+            continue
+
+        if m.lastgroup == "hyperlink":
+            display=m.group("display")
+            if display is not None:
+                display=display.strip()
+            yield LinkToken(Hyperlink, m.group("url"), display or None, m.start(), m.end())
+        else:
+            yield LinkToken(RedirectLink, m.group("dest").strip(), None, m.start(), m.end())
+        pos=m.end()
+
+
+# *****************************************************************
+# The fast path for the common case: just page links, found with str.find()
+def _TokenizePageLinks(source):
+    pos=0
+    while True:
+        loc=source.find("[[[", pos)
+        if loc == -1:
+            return
+        loc2=source.find("]]]", loc+3)
+        if loc2 == -1:
+            return
+        yield _PageLinkToken(source, loc, loc2)
+        pos=loc2+3
+
+
+# *****************************************************************
+# Build the token for the page link whose "[[[" is at loc and whose "]]]" is at loc2
+# If there is a "|" in the link, then only the text to the left of the "|" is the link; the rest is display text
+def _PageLinkToken(source, loc, loc2):
+    bar=source.find("|", loc+3, loc2)
+    if bar == -1:
+        return LinkToken(PageLink, source[loc+3:loc2].strip(), None, loc, loc2+3)
+    return LinkToken(PageLink, source[loc+3:bar].strip(), source[bar+1:loc2].strip(), loc, loc2+3)
+
+
+# *****************************************************************
+# Return the set of distinct page names linked to from source
+def PageLinks(source):
+    return {t.Target for t in _TokenizePageLinks(source)}
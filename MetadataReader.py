@@ -0,0 +1,144 @@
+import os
+import json
+import argparse
+import itertools
+import collections
+import xml.etree.ElementTree as ET
+import SiteDiscovery
+
+# Read the title and tags from a page's <name>.xml metadata file (as written by WikidotHelpers.SaveMetadata)
+#
+# Rather than building the whole element tree for each file, a large file is streamed through an incremental (iterparse-style) parser.  Each
+# top-level element is cleared as soon as it has been looked at, and reading stops as soon as both the title and the tags have been seen.
+# (SaveMetadata doesn't write a <tags> element for a page with no tags, so for those pages the whole file is read, but nothing is kept except
+# the title.)
+# A file which fits in a single read (which is nearly all of them -- SaveMetadata doesn't save the page content) is parsed whole with
+# ET.fromstring: at a few hundred bytes, setting up the incremental parser costs more than building the little tree does.  Benchmark.py's
+# "metadata" benchmark compares the two.
+#
+# In bulk mode, ReadMetadataIndex reads the metadata of every page in a site directory in one pass, giving a consolidated index of
+# page name -> PageMetadata, which can be saved to (and later loaded from) a single JSON file.
+#
+# Title is None if the file has no <title> (SaveMetadata leaves it out when Wikidot gave none); the loader then uses the page's name instead.
+
+PageMetadata=collections.namedtuple("PageMetadata", "Title, Tags")   # Tags is None if the page has no <tags> element
+
+
+# *****************************************************************
+# Read the metadata from a complete (small) xml file in memory
+def _ReadMetadataWhole(xmlBytes):
+    e=ET.fromstring(xmlBytes)
+    titleEl=e.find("title")
+    tagsEl=e.find("tags")
+    return PageMetadata(titleEl.text if titleEl is not None else None, [t.text for t in tagsEl.findall("tag")] if tagsEl is not None else None)
+
+
+# *****************************************************************
+# Read the metadata from a sequence of chunks of xml, stopping as soon as we have it
+# This is the incremental pull parser that ET.iterparse wraps, used directly so we can feed it chunks and abandon it part way through.
+def _ReadMetadataChunks(chunks):
+    parser=ET.XMLPullParser(("start", "end"))
+    state=_MetadataState()
+    for chunk in chunks:
+        parser.feed(chunk)
+        if state.Consume(parser.read_events()):
+            return state.Metadata()
+    parser.close()
+    state.Consume(parser.read_events())
+    return state.Metadata()
+
+
+class _MetadataState:
+    def __init__(self):
+        self.title=None
+        self.tags=None
+        self.haveTitle=False
+        self.depth=0
+        self.root=None
+
+    # Process a batch of parser events.  Returns True once both the title and the tags have been found.
+    def Consume(self, events):
+        for event, el in events:
+            if event == "start":
+                if self.root is None:
+                    self.root=el
+                self.depth+=1
+                continue
+            self.depth-=1
+            if self.depth != 1:     # We only care about the children of the root (<data>).  Their contents are handled when the child itself ends.
+                continue
+            if el.tag == "title" and not self.haveTitle:
+                self.title=el.text
+                self.haveTitle=True
+            elif el.tag == "tags" and self.tags is None:
+                self.tags=[t.text for t in el.findall("tag")]
+            self.root.clear()        # Drop the elements we've finished with
+            if self.haveTitle and self.tags is not None:
+                return True
+        return False
+
+    def Metadata(self):
+        return PageMetadata(self.title, self.tags)
+
+
+_chunkSize=65536
+
+
+# *****************************************************************
+# Read the metadata from the contents of an xml file
+def ReadMetadataBytes(xmlBytes):
+    if len(xmlBytes) <= _chunkSize:
+        return _ReadMetadataWhole(xmlBytes)
+    view=memoryview(xmlBytes)
+    return _ReadMetadataChunks(view[i:i+_chunkSize] for i in range(0, len(view), _chunkSize))
+
+
+# *****************************************************************
+# Read the metadata from an open binary file
+def ReadMetadataStream(f):
+    first=f.read(_chunkSize)
+    if len(first) < _chunkSize:
+        return _ReadMetadataWhole(first)
+    return _ReadMetadataChunks(itertools.chain([first], iter(lambda: f.read(_chunkSize), b"")))
+
+
+# *****************************************************************
+# Read the metadata from an xml file
+def ReadMetadataFile(pathname):
+    with open(pathname, "rb") as f:
+        return ReadMetadataStream(f)
+
+
+# *****************************************************************
+# Bulk mode: read the metadata of every page in a site directory
+# Returns an OrderedDict of page name -> PageMetadata.  The pages are found by SiteDiscovery.DiscoverPages (with rules, by default the loader's),
+# so the index has the same keys, in the same order, as the site the loader gives.
+def ReadMetadataIndex(dir, rules=None):
+    index=collections.OrderedDict()
+    for name in SiteDiscovery.DiscoverPages(dir, rules):
+        index[name]=ReadMetadataFile(os.path.join(dir, name+".xml"))
+    return index
+
+
+# *****************************************************************
+# Save a metadata index to a single JSON file, and load it back
+def SaveMetadataIndex(index, filename):
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump({name: [md.Title, md.Tags] for name, md in index.items()}, f, ensure_ascii=False)
+
+def LoadMetadataIndex(filename):
+    with open(filename, "r", encoding="utf-8") as f:
+        data=json.load(f, object_pairs_hook=collections.OrderedDict)
+    return collections.OrderedDict((name, PageMetadata(title, tags)) for name, (title, tags) in data.items())
+
+
+# *****************************************************************
+# Usage:  python MetadataReader.py <site directory> <index file>
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser(description="Build a consolidated index of the page metadata in a Wikidot site image")
+    parser.add_argument("dir")
+    parser.add_argument("index", help="the JSON file to write the index to")
+    args=parser.parse_args()
+    index=ReadMetadataIndex(args.dir)
+    SaveMetadataIndex(index, args.index)
+    print(str(len(index))+" pages")
@@ -0,0 +1,106 @@
+import json
+import time
+import cProfile
+import threading
+import functools
+import contextlib
+import collections
+
+# Timers and counters for the phases of an analysis run
+#
+# Wrap a phase in
+#       with Metrics.metrics.Phase("name"):
+# to accumulate its wall-clock and CPU time and the number of times it ran, and call
+#       Metrics.metrics.Count("name", n)
+# to add to a counter.  Save() writes everything out as JSON.  A whole function can be timed as a phase by decorating it with @Metrics.Timed("name").
+#
+# The metrics are per-process: work done in the worker processes of the parallel loader is only seen as the time the parent spends waiting for it.
+# Phases and counters can be recorded from several threads at once (e.g., by the report passes run concurrently).  A phase's CPU time is that of
+# the whole process, so phases running at the same time on different threads each include the others' CPU time.
+#
+# One phase can also be profiled: set profilePhase to its name, and each time it runs it is profiled with cProfile.  The accumulated profile is
+# written (in pstats format) to profileFile when the metrics are saved.  Only runs of the phase on the main thread are profiled.
+
+
+# *****************************************************************
+class Metrics:
+    def __init__(self):
+        self.phases=collections.OrderedDict()     # Phase name -> {"wall": seconds, "cpu": seconds, "calls": count}
+        self.counters=collections.OrderedDict()
+        self.profilePhase=None
+        self.profileFile="profile.pstats"
+        self._profiler=None
+        self._lock=threading.Lock()
+
+    # -----------------------------------
+    def Reset(self):
+        with self._lock:
+            self.phases.clear()
+            self.counters.clear()
+            self._profiler=None
+
+    # -----------------------------------
+    # Time a phase.  Phases may be nested; each is timed separately (so the times of nested phases are included in the times of their parents).
+    @contextlib.contextmanager
+    def Phase(self, name):
+        profiling=name == self.profilePhase and threading.current_thread() is threading.main_thread()
+        if profiling:
+            if self._profiler is None:
+                self._profiler=cProfile.Profile()
+            self._profiler.enable()
+        wall=time.perf_counter()
+        cpu=time.process_time()
+        try:
+            yield
+        finally:
+            wall=time.perf_counter()-wall
+            cpu=time.process_time()-cpu
+            if profiling:
+                self._profiler.disable()
+            with self._lock:
+                phase=self.phases.get(name)
+                if phase is None:
+                    phase={"wall": 0.0, "cpu": 0.0, "calls": 0}
+                    self.phases[name]=phase
+                phase["wall"]+=wall
+                phase["cpu"]+=cpu
+                phase["calls"]+=1
+
+    # -----------------------------------
+    # Add to a counter
+    def Count(self, name, n=1):
+        with self._lock:
+            self.counters[name]=self.counters.get(name, 0)+n
+
+    # Set a value (e.g., a statistic gathered at the end of a run)
+    def Set(self, name, value):
+        with self._lock:
+            self.counters[name]=value
+
+    # -----------------------------------
+    def ToDict(self):
+        return {"phases": self.phases, "counters": self.counters}
+
+    # -----------------------------------
+    # Write the metrics to a JSON file, and the profile (if any) to profileFile
+    def Save(self, filename):
+        with open(filename, "w") as f:
+            json.dump(self.ToDict(), f, indent=2)
+        if self._profiler is not None:
+            self._profiler.dump_stats(self.profileFile)
+
+
+# The metrics for this process
+metrics=Metrics()
+
+
+# *****************************************************************
+# Decorator which times each call of a function as a phase
+def Timed(name):
+    def Decorate(fn):
+        @functools.wraps(fn)
+        def Wrapper(*args, **kwargs):
+            with metrics.Phase(name):
+                return fn(*args, **kwargs)
+        return Wrapper
+    return Decorate
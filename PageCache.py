@@ -0,0 +1,146 @@
+import os
+import pickle
+import hashlib
+
+# A persistent on-disk cache of parsed pages, so that pages which have not changed since the last run need not be re-read and re-parsed.
+#
+# Each entry is keyed by the page's pathname (without extension) and records:
+#   The size and modification time of the page's .xml and .txt files
+#   A digest of the contents of the two files
+#   The PageInfo which was parsed from them
+#
+# An entry is valid if the sizes and times still match.  If only the times have changed (e.g., the snapshot was re-extracted), the files are
+# re-hashed and the entry is still used if the contents are unchanged.
+#
+# The cache file records two versions:
+#   CacheVersion -- the layout of the cache file itself.  A cache file with a different CacheVersion is ignored.
+#   The link rules version -- the version of the rules used to parse the pages (SiteLoader.LinkRulesVersion).  When it changes, all entries are discarded.
+
+CacheVersion=1
+
+
+# *****************************************************************
+# Compute the digest of a page's contents.  (xmlBytes is None for a page with no metadata: see SiteLoader.ParsePage.)
+def PageDigest(xmlBytes, sourceBytes):
+    h=hashlib.blake2b(digest_size=16)
+    if xmlBytes is not None:
+        h.update(xmlBytes)
+    h.update(b"\0")
+    h.update(sourceBytes)
+    return h.digest()
+
+
+# *****************************************************************
+# Get the (size, mtime) stamps of a page's two files, or None if either is missing
+def PageStamp(pathname):
+    try:
+        x=os.stat(pathname+".xml")
+        t=os.stat(pathname+".txt")
+    except OSError:
+        return None
+    return (x.st_size, x.st_mtime_ns, t.st_size, t.st_mtime_ns)
+
+
+# *****************************************************************
+class PageCache:
+    def __init__(self, filename):
+        self.filename=filename
+        self.rulesVersion=None
+        self.entries={}     # Maps pathname to (stamp, digest, PageInfo)
+        self.dirty=False
+        self.Hits=0
+        self.Misses=0
+        self.Load()
+
+    # -----------------------------------
+    # Read the cache file.  A missing, unreadable or out-of-date cache file just gives an empty cache.
+    def Load(self):
+        self.entries={}
+        self.rulesVersion=None
+        if not os.path.exists(self.filename):
+            return
+        try:
+            with open(self.filename, "rb") as f:
+                data=pickle.load(f)
+        except Exception:
+            return
+        if not isinstance(data, dict) or data.get("CacheVersion") != CacheVersion:
+            return
+        self.rulesVersion=data["RulesVersion"]
+        self.entries=data["Entries"]
+
+    # -----------------------------------
+    # Write the cache file (if anything has changed)
+    # We write to a temporary file and then rename it so that an interrupted run can't leave a damaged cache behind.
+    def Save(self):
+        if not self.dirty:
+            return
+        temp=self.filename+".tmp"
+        with open(temp, "wb") as f:
+            pickle.dump({"CacheVersion": CacheVersion, "RulesVersion": self.rulesVersion, "Entries": self.entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, self.filename)
+        self.dirty=False
+
+    # -----------------------------------
+    # Discard all entries if they were made using a different version of the link-extraction rules
+    def CheckRules(self, rulesVersion):
+        if self.rulesVersion == rulesVersion:
+            return
+        self.entries={}
+        self.rulesVersion=rulesVersion
+        self.dirty=True
+
+    # -----------------------------------
+    # Look up a page.
+    # Returns (PageInfo, stamp).  PageInfo is None if the page must be parsed.  The stamp is taken *before* the files are read and must be passed on to Store().
+    def Lookup(self, dirpath, fname):
+        pathname=os.path.join(dirpath, fname)
+        stamp=PageStamp(pathname)
+        entry=self.entries.get(pathname)
+        if entry is None or stamp is None:
+            self.Misses+=1
+            return None, stamp
+
+        oldStamp, oldDigest, pageInfo=entry
+        if stamp == oldStamp:
+            self.Hits+=1
+            return pageInfo, stamp
+
+        # If the sizes are unchanged, the file may only have been touched.  Check the contents.
+        if stamp[0] == oldStamp[0] and stamp[2] == oldStamp[2]:
+            with open(pathname+".xml", "rb") as f:
+                xmlBytes=f.read()
+            with open(pathname+".txt", "rb") as f:
+                sourceBytes=f.read()
+            if PageDigest(xmlBytes, sourceBytes) == oldDigest:
+                self.entries[pathname]=(stamp, oldDigest, pageInfo)
+                self.dirty=True
+                self.Hits+=1
+                return pageInfo, stamp
+
+        self.Misses+=1
+        return None, stamp
+
+    # -----------------------------------
+    # Record a freshly parsed page
+    def Store(self, dirpath, fname, stamp, digest, pageInfo):
+        if stamp is None:
+            return
+        self.entries[os.path.join(dirpath, fname)]=(stamp, digest, pageInfo)
+        self.dirty=True
+
+    # -----------------------------------
+    # Remove the entries for pages which no longer exist.
+    # If keep (an iterable of pathnames) is supplied, everything else is removed; otherwise each entry's files are checked on disk.
+    # Returns the number of entries removed.
+    def Prune(self, keep=None):
+        if keep is not None:
+            keep=set(keep)
+            dead=[p for p in self.entries if p not in keep]
+        else:
+            dead=[p for p in self.entries if not os.path.exists(p+".txt") or not os.path.exists(p+".xml")]
+        for p in dead:
+            del self.entries[p]
+        if len(dead) > 0:
+            self.dirty=True
+        return len(dead)
@@ -0,0 +1,182 @@
+import collections
+import WikidotHelpers
+import Metrics
+
+# Resolve the redirects in a site.
+#
+# The redirect graph (each redirect page pointing to the Wikidot canonical name of its destination) is built once, and every chain of redirects
+# is followed to its end in a single linear pass.  As each chain is walked, the result is recorded for every page along it (path compression),
+# so no page is ever walked twice.
+#
+# Each redirect page gets a Resolution:
+#   Final  -- the name of the page the chain ends at: a real (non-redirect) page, a missing page, or None for a cycle
+#   Status -- Resolved, Missing or Cycle
+#   Length -- the number of redirect hops from this page to the end of the chain (1 for a simple redirect)
+#             For a page in, or leading into, a cycle, it is the number of hops before a page repeats.
+
+Resolution=collections.namedtuple("Resolution", "Final, Status, Length")
+
+Resolved="resolved"
+Missing="missing"
+Cycle="cycle"
+
+
+# *****************************************************************
+class RedirectResolver:
+    @Metrics.Timed("ResolveRedirects")
+    def __init__(self, site, canonicize=WikidotHelpers.Cannonicize):
+        self.site=site
+        self.canonicize=canonicize
+        self.targets={}         # Maps each redirect page to the canonical name of the page it redirects to
+        self.sources={}         # The reverse: maps each redirect target to the set of redirect pages pointing at it
+        for key, val in site.items():
+            if val.Redirect is not None:
+                self._SetTarget(key, canonicize(val.Redirect))
+        self.resolutions={}
+        for key in self.targets:
+            self._Resolve(key)
+
+    # -----------------------------------
+    # Walk the chain starting at key until we reach a page whose resolution is already known, a page which isn't a redirect, a missing page, or
+    # a page already on this walk (a cycle).  Then fill in the resolutions of all the pages walked, from the far end back.
+    def _Resolve(self, key):
+        if key in self.resolutions:
+            return
+        path=[]
+        onPath={}
+        node=key
+        while True:
+            if node in self.resolutions:
+                end=self.resolutions[node]
+                break
+            if node not in self.site:
+                end=Resolution(node, Missing, 0)
+                break
+            if node not in self.targets:
+                end=Resolution(node, Resolved, 0)
+                break
+            if node in onPath:
+                # Everything from the first visit to node onwards is the cycle
+                cycle=path[onPath[node]:]
+                for n in cycle:
+                    self.resolutions[n]=Resolution(None, Cycle, len(cycle))
+                path=path[:onPath[node]]
+                end=Resolution(None, Cycle, len(cycle))
+                break
+            onPath[node]=len(path)
+            path.append(node)
+            node=self.targets[node]
+
+        for n in reversed(path):
+            end=Resolution(end.Final, end.Status, end.Length+1)
+            self.resolutions[n]=end
+
+    # -----------------------------------
+    def _SetTarget(self, key, target):
+        self.targets[key]=target
+        self.sources.setdefault(target, set()).add(key)
+
+    def _RemoveTarget(self, key):
+        target=self.targets.pop(key, None)
+        if target is not None:
+            sources=self.sources[target]
+            sources.discard(key)
+            if len(sources) == 0:
+                del self.sources[target]
+
+    # -----------------------------------
+    # Bring the resolutions up to date after the pages in keys have been changed, added to or deleted from the site.
+    # Only the chains which pass through (or end at) one of those pages are re-resolved.
+    # Returns the set of pages whose redirect chains may have changed: keys themselves, and every redirect page leading to one of them.
+    def Update(self, keys):
+        for key in keys:
+            self._RemoveTarget(key)
+            val=self.site.get(key)
+            if val is not None and val.Redirect is not None:
+                self._SetTarget(key, self.canonicize(val.Redirect))
+
+        # Everything which leads to a changed page is affected: walk the redirects backwards from them
+        affected=set()
+        stack=list(keys)
+        while len(stack) > 0:
+            node=stack.pop()
+            if node in affected:
+                continue
+            affected.add(node)
+            stack.extend(self.sources.get(node, ()))
+
+        for key in affected:
+            self.resolutions.pop(key, None)
+        for key in affected:
+            if key in self.targets:
+                self._Resolve(key)
+        return affected
+
+    # -----------------------------------
+    # Get the Resolution of a redirect page (None if it isn't a redirect)
+    def Resolve(self, key):
+        return self.resolutions.get(key)
+
+    # -----------------------------------
+    # Return the list of pages visited following the redirects from key: key itself, then each page redirected to, ending with the last page which
+    # exists in the site.  (For a cycle, it stops just before the first repeated page.)
+    def Chain(self, key):
+        chain=[key]
+        seen={key}
+        node=key
+        while node in self.targets:
+            node=self.targets[node]
+            if node not in self.site or node in seen:
+                break
+            chain.append(node)
+            seen.add(node)
+        return chain
+
+    # -----------------------------------
+    # The canonical name the redirect page key points at directly
+    def Target(self, key):
+        return self.targets.get(key)
+
+    # -----------------------------------
+    # Return the redirect pages (in site order) whose chains are two or more redirects long, or which lead into a cycle
+    def MultipleRedirects(self):
+        return [k for k in self.targets if self.resolutions[k].Status == Cycle or self.resolutions[k].Length > 1]
+
+    # -----------------------------------
+    # Return the redirect pages (in site order) which redirect directly to a page that doesn't exist
+    def MissingTargets(self):
+        return [k for k in self.targets if self.targets[k] not in self.site]
+
+    # -----------------------------------
+    # Return the redirect pages (in site order) which are part of, or lead into, a cycle
+    def Cycles(self):
+        return [k for k in self.targets if self.resolutions[k].Status == Cycle]
+
+    # -----------------------------------
+    # Return a Counter of chain lengths
+    def ChainLengths(self):
+        return collections.Counter(r.Length for r in self.resolutions.values())
+
+
+# *****************************************************************
+# The data of CaseAnalysis's double redirect and missing redirect target reports.  redirects is the site's RedirectResolver.
+
+# DoubleRedirects() returns a list of DoubleRedirect tuples, one for each redirect page whose chain is two or more redirects long or leads into a cycle
+DoubleRedirect=collections.namedtuple("DoubleRedirect", "Chain, Status, End")     # Chain is the list of pages; End is the missing or repeated page, if any
+
+def DoubleRedirects(site, redirects):
+    return [DoubleRedirectOf(redirects, key) for key in redirects.MultipleRedirects()]
+
+# The DoubleRedirect for one redirect page (None if it's a simple redirect)
+def DoubleRedirectOf(redirects, key):
+    resolution=redirects.Resolve(key)
+    if resolution is None or (resolution.Status != Cycle and resolution.Length < 2):
+        return None
+    chain=redirects.Chain(key)
+    end=redirects.Target(chain[-1]) if resolution.Status != Resolved else None
+    return DoubleRedirect(chain, resolution.Status, end)
+
+# -----------------------------------
+# MissingRedirectTargets() returns a list of (page, missing target) pairs
+def MissingRedirectTargets(site, redirects):
+    return [(key, redirects.Target(key)) for key in redirects.MissingTargets()]
@@ -0,0 +1,155 @@
+import types
+import collections
+import Metrics
+from concurrent.futures import ThreadPoolExecutor
+
+# Run reports as passes over a shared, read-only index of a site
+#
+# Each report is a ReportPass.  A pass reads (at most) one of the index's streams:
+#   Pages  -- (page name, PageInfo) for each page, in site order; each is handed to the pass's AddPage()
+#   Groups -- the three-level groups of the links (see LinkGroups); each is handed to the pass's AddGroup()
+# and then its Finish() writes whatever is left of the report and returns the report's (label, count) summary lines.  A pass which reads no
+# stream does all its work in Finish(), from the index.
+#
+# RunPasses goes over each stream just once, handing every item to all the passes which read it -- so adding a report adds no scan of the site.
+# Or, if asked, it runs each stream (and each pass which reads none) on its own thread.  (Threads only gain where the work waits on something,
+# such as the on-disk sort of ExternalSort; otherwise the saving comes from fusing the passes.)  The output is the same either way.
+#
+# The index (SiteIndex) is built in full before any pass runs and isn't changed by them: the site is a read-only mapping, and the inverse link
+# map and the redirect resolution which the passes need are built up front rather than on first use.  So the passes can safely share it.
+#
+# Each pass writes its report through a ReportSink, which collects the lines and writes them out a chunk at a time rather than a line at a time.
+
+Pages="pages"
+Groups="groups"
+
+
+# *****************************************************************
+# The read-only index the passes run over.
+# inverseSite and redirects are the site's inverse link map and RedirectResolver (None if no pass needs them); groups is a function giving the
+# stream of groups.
+class SiteIndex:
+    def __init__(self, site, inverseSite=None, redirects=None, groups=None):
+        self.Site=types.MappingProxyType(site)
+        self.InverseSite=inverseSite
+        self.Redirects=redirects
+        self._groups=groups
+
+    # -----------------------------------
+    def Stream(self, name):
+        if name == Pages:
+            return self.Site.items()
+        if name == Groups:
+            return self._groups()
+        raise ValueError("Unknown stream '"+name+"'")
+
+
+# *****************************************************************
+# The base class of the passes.  A pass sets:
+#   Filename -- the file its report is written to
+#   Stream   -- the stream it reads (Pages, Groups or None)
+#   Needs    -- the parts of the index it uses besides the site ("inverseSite", "redirects")
+# sink is the pass's ReportSink; dump is the sink for the debug dump (None unless it was asked for).
+class ReportPass:
+    Filename=None
+    Stream=None
+    Needs=()
+
+    def __init__(self, index, sink, dump=None):
+        self.index=index
+        self.sink=sink
+        self.dump=dump
+
+    def AddPage(self, key, val):
+        pass
+
+    def AddGroup(self, group):
+        pass
+
+    # Returns the list of (label, count) summary lines
+    def Finish(self):
+        return []
+
+
+# *****************************************************************
+# Buffered output for a report
+class ReportSink:
+    def __init__(self, f, chunkLines=4096):
+        self.f=f
+        self.chunkLines=chunkLines
+        self.lines=[]
+        self.count=0        # The number of lines written
+
+    # -----------------------------------
+    def Write(self, line):
+        self.lines.append(line)
+        self.count+=1
+        if len(self.lines) >= self.chunkLines:
+            self.Flush()
+
+    # -----------------------------------
+    # Write out the lines collected so far.  If they can't all be encoded, they're written one at a time, and each which can't is replaced by a
+    # warning and its UTF-8 bytes, just as CaseAnalysis.tempPrint does.
+    def Flush(self):
+        if len(self.lines) == 0:
+            return
+        try:
+            self.f.write("\n".join(self.lines)+"\n")
+        except UnicodeError:
+            for line in self.lines:
+                try:
+                    self.f.write(line+"\n")
+                except UnicodeError:
+                    self.f.write("***** Warning. Character ugliness follows!\n")
+                    self.f.write(str(line.encode("UTF-8"))+"\n")
+        self.lines=[]
+
+
+# *****************************************************************
+# The parts of the index which a list of pass classes need, including the streams they read
+def PassNeeds(passClasses):
+    needs=set()
+    for cls in passClasses:
+        needs.update(cls.Needs)
+        if cls.Stream is not None:
+            needs.add(cls.Stream)
+    return needs
+
+# -----------------------------------
+# Run the passes over the index, going over each stream once.  If concurrent is true, the streams (and the passes which read none) each get a
+# thread of their own.  Returns the passes' summary lines, in the order of the passes.
+@Metrics.Timed("RunPasses")
+def RunPasses(index, passes, concurrent=False):
+    jobs=collections.OrderedDict()      # Stream name (or the pass itself, for one which reads no stream) -> the passes run together
+    for p in passes:
+        jobs.setdefault(p.Stream if p.Stream is not None else p, []).append(p)
+
+    summaries={}
+    if concurrent and len(jobs) > 1:
+        with ThreadPoolExecutor(len(jobs)) as pool:
+            for future in [pool.submit(_RunJob, index, stream, ps) for stream, ps in jobs.items()]:
+                summaries.update(future.result())
+    else:
+        for stream, ps in jobs.items():
+            summaries.update(_RunJob(index, stream, ps))
+
+    summary=[]
+    for p in passes:
+        summary.extend(summaries[p])
+    return summary
+
+# Go over one stream, handing each item to all of the passes, and then finish them.  Returns a dictionary of each pass's summary lines.
+def _RunJob(index, stream, passes):
+    if stream == Pages:
+        with Metrics.metrics.Phase("PagesPass"):
+            adders=[p.AddPage for p in passes]
+            for key, val in index.Stream(Pages):
+                for add in adders:
+                    add(key, val)
+    elif stream == Groups:
+        with Metrics.metrics.Phase("GroupsPass"):
+            adders=[p.AddGroup for p in passes]
+            for group in index.Stream(Groups):
+                for add in adders:
+                    add(group)
+    return {p: p.Finish() for p in passes}
@@ -0,0 +1,248 @@
+import os
+import sys
+import sqlite3
+import argparse
+import itertools
+import collections
+import WikidotHelpers
+import LinkGroups
+import Redirects
+import Metrics
+import ZipSite
+import SiteLoader
+from SiteLoader import PageInfo
+
+# A SQLite database holding a loaded site, so that questions about it can be answered without reloading the site
+#
+# The tables are:
+#   pages     -- one row per page: its name (the site key), title, redirect (if any), and the Wikidot form of the redirect.  seq is the page's
+#                position in the site, so that everything comes back out in the same order the site was loaded in.
+#   tags      -- the page's tags, in order.  (A page with no <tags> element has hasTags=0 in pages, to tell it from one with an empty list.)
+#   links     -- one row per (page, raw link text).  As in inverseSite, a redirect page counts as linking to its destination (isRedirect=1).
+#   linkForms -- the Wikidot and Mediawiki canonical forms of each distinct raw link text
+# There are indexes on the link texts, the pages and the canonical forms.
+#
+# Build() loads the whole thing in one transaction with bulk inserts, creating the indexes afterwards.
+# The query methods answer the common questions (who links to a page, what spellings are used for it, what redirects to it), and the reports
+# run as queries too, giving the same data as the corresponding functions in CaseAnalysis.
+#
+# Usage:
+#   python SiteDatabase.py build <site directory or zip> <database>
+#   python SiteDatabase.py backlinks|spellings|redirects <database> <page name>
+#   python SiteDatabase.py report <database> multiple|lowercase|double|missing
+
+_schema="""
+CREATE TABLE pages (seq INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, title TEXT, hasTags INTEGER NOT NULL, redirect TEXT, redirectWikidot TEXT);
+CREATE TABLE tags (page TEXT NOT NULL, seq INTEGER NOT NULL, tag TEXT);
+CREATE TABLE links (page TEXT NOT NULL, pageSeq INTEGER NOT NULL, raw TEXT NOT NULL, isRedirect INTEGER NOT NULL);
+CREATE TABLE linkForms (raw TEXT PRIMARY KEY, wikidot TEXT NOT NULL, mediawiki TEXT NOT NULL);
+"""
+
+_indexes="""
+CREATE INDEX pagesRedirectWikidot ON pages (redirectWikidot);
+CREATE INDEX tagsPage ON tags (page);
+CREATE INDEX linksRaw ON links (raw, pageSeq);
+CREATE INDEX linksPage ON links (page);
+CREATE INDEX linkFormsWikidot ON linkForms (wikidot, mediawiki, raw);
+CREATE INDEX linkFormsMediawiki ON linkForms (mediawiki);
+"""
+
+
+# *****************************************************************
+class SiteDatabase:
+    def __init__(self, filename):
+        self.filename=filename
+        self.connection=sqlite3.connect(filename)
+        # SQLite's lower() only knows ASCII; the reports need Python's rules
+        self.connection.create_function("PyLower", 1, lambda s: s.lower() if s is not None else None, deterministic=True)
+        self.connection.create_function("PyIsDigit", 1, lambda s: s.isdigit() if s is not None else None, deterministic=True)
+
+    def Close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
+
+    # -----------------------------------
+    # Create a new database (replacing any existing one) holding site
+    @classmethod
+    @Metrics.Timed("BuildDatabase")
+    def Build(cls, filename, site):
+        if os.path.exists(filename):
+            os.remove(filename)
+        db=cls(filename)
+        c=db.connection
+        c.execute("PRAGMA journal_mode=OFF")     # The database is rebuilt from scratch if anything goes wrong, so we don't need a journal
+        c.execute("PRAGMA synchronous=OFF")
+        c.executescript(_schema)
+
+        with c:
+            c.executemany("INSERT INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                          ((seq, key, val.Title, val.Tags is not None, val.Redirect, WikidotHelpers.Cannonicize(val.Redirect) if val.Redirect is not None else None)
+                           for seq, (key, val) in enumerate(site.items())))
+            c.executemany("INSERT INTO tags VALUES (?, ?, ?)",
+                          ((key, i, tag) for key, val in site.items() if val.Tags is not None for i, tag in enumerate(val.Tags)))
+            c.executemany("INSERT INTO links VALUES (?, ?, ?, ?)", _LinkRows(site))
+
+            raws=[r for (r,) in c.execute("SELECT DISTINCT raw FROM links")]
+            c.executemany("INSERT INTO linkForms VALUES (?, ?, ?)",
+                          zip(raws, WikidotHelpers.CannonicizeBatch(raws), map(WikidotHelpers.MediawikiCanonicizeFast, raws)))
+        c.executescript(_indexes)
+        c.execute("ANALYZE")
+        return db
+
+    # -----------------------------------
+    # Rebuild the site dictionary (equal to the one the database was built from)
+    def Site(self):
+        c=self.connection
+        tags=collections.defaultdict(list)
+        for page, tag in c.execute("SELECT page, tag FROM tags ORDER BY page, seq"):
+            tags[page].append(tag)
+        links=collections.defaultdict(set)
+        for page, raw in c.execute("SELECT page, raw FROM links WHERE isRedirect=0"):
+            links[page].add(raw)
+        site={}
+        for name, title, hasTags, redirect in c.execute("SELECT name, title, hasTags, redirect FROM pages ORDER BY seq"):
+            site[name]=PageInfo(title, name, tags.get(name, []) if hasTags else None, links.get(name, set()) if redirect is None else None, redirect)
+        return site
+
+    # Rebuild inverseSite: raw link text -> the list of pages using it, in site order
+    def InverseSite(self):
+        inverseSite={}
+        for raw, page in self.connection.execute("SELECT raw, page FROM links ORDER BY pageSeq"):
+            inverseSite.setdefault(raw, []).append(page)
+        return inverseSite
+
+    # -----------------------------------
+    # The pages which link to name (a page name in any spelling), as (page, raw link text) pairs in site order
+    def Backlinks(self, name):
+        return self.connection.execute("SELECT l.page, l.raw FROM linkForms f JOIN links l ON l.raw = f.raw WHERE f.wikidot = ? ORDER BY l.pageSeq, l.raw",
+                                       (WikidotHelpers.Cannonicize(name),)).fetchall()
+
+    # The raw spellings used in links which Wikidot takes to name, as (raw link text, Mediawiki form, number of pages using it), sorted
+    def Spellings(self, name):
+        return self.connection.execute("SELECT f.raw, f.mediawiki, COUNT(*) FROM linkForms f JOIN links l ON l.raw = f.raw WHERE f.wikidot = ? "
+                                       "GROUP BY f.raw ORDER BY f.mediawiki, f.raw", (WikidotHelpers.Cannonicize(name),)).fetchall()
+
+    # The redirect pages which point to name.  If transitive is true, also those which get there through a chain of redirects.
+    def RedirectsTo(self, name, transitive=False):
+        target=WikidotHelpers.Cannonicize(name)
+        if not transitive:
+            return [r for (r,) in self.connection.execute("SELECT name FROM pages WHERE redirectWikidot = ? ORDER BY seq", (target,))]
+        return [r for (r,) in self.connection.execute("""
+            WITH RECURSIVE chain(name) AS (
+                SELECT name FROM pages WHERE redirectWikidot = ?
+                UNION
+                SELECT p.name FROM pages p JOIN chain ON p.redirectWikidot = chain.name)
+            SELECT p.name FROM chain JOIN pages p ON p.name = chain.name WHERE p.name != ? ORDER BY p.seq""", (target, target))]
+
+    # -----------------------------------
+    # The reports, as queries.  Each gives the same data as the CaseAnalysis function of the same name.
+
+    # The Wikidot groups (see LinkGroups) which have more than one Mediawiki form
+    def MultipleForms(self):
+        rows=self.connection.execute("""
+            SELECT f.wikidot, f.mediawiki, f.raw, l.page FROM linkForms f JOIN links l ON l.raw = f.raw
+            WHERE f.wikidot IN (SELECT wikidot FROM linkForms GROUP BY wikidot HAVING COUNT(DISTINCT mediawiki) > 1)
+            ORDER BY f.wikidot, f.mediawiki, f.raw, l.pageSeq""")
+        records=((w, m, r, [row[3] for row in pages]) for (w, m, r), pages in itertools.groupby(rows, key=lambda row: row[:3]))
+        return LinkGroups.GroupSortedRecords(records)
+
+    def LowercaseRedirects(self):
+        return self.connection.execute("SELECT name, redirect FROM pages WHERE redirect IS NOT NULL AND redirect = PyLower(redirect) AND NOT PyIsDigit(redirect) "
+                                       "ORDER BY seq").fetchall()
+
+    def MissingRedirectTargets(self):
+        return self.connection.execute("SELECT name, redirectWikidot FROM pages WHERE redirect IS NOT NULL "
+                                       "AND redirectWikidot NOT IN (SELECT name FROM pages) ORDER BY seq").fetchall()
+
+    # The chains are followed using just the redirect pages' rows
+    def DoubleRedirects(self):
+        site=self.RedirectSite()
+        return Redirects.DoubleRedirects(site, Redirects.RedirectResolver(site))
+
+    # A site dictionary with just enough in it for redirect resolution: the redirect pages, and placeholders for the pages they point at
+    def RedirectSite(self):
+        site={}
+        for name, title, redirect in self.connection.execute("""
+                SELECT name, title, redirect FROM pages
+                WHERE redirect IS NOT NULL OR name IN (SELECT redirectWikidot FROM pages WHERE redirect IS NOT NULL) ORDER BY seq"""):
+            site[name]=PageInfo(title, name, None, None, redirect)
+        return site
+
+
+# -----------------------------------
+def _LinkRows(site):
+    for seq, (key, val) in enumerate(site.items()):
+        if val.Links is not None:
+            for link in val.Links:
+                yield key, seq, link, 0
+        elif val.Redirect is not None:
+            yield key, seq, val.Redirect, 1
+
+
+# *****************************************************************
+# The command line
+def main(argv=None):
+    parser=argparse.ArgumentParser(description="Build and query a SQLite index of a Wikidot site")
+    commands=parser.add_subparsers(dest="command", required=True)
+    build=commands.add_parser("build", help="load a site and build the database")
+    build.add_argument("root", help="the site directory, or a zipped Wikidot backup")
+    build.add_argument("database")
+    build.add_argument("--workers", type=int, default=0)
+    for name, helpText in [("backlinks", "the pages which link to a page"), ("spellings", "the spellings of the links to a page"),
+                           ("redirects", "the redirects to a page")]:
+        query=commands.add_parser(name, help=helpText)
+        query.add_argument("database")
+        query.add_argument("name")
+        if name == "redirects":
+            query.add_argument("--transitive", action="store_true", help="include the redirects which get there through a chain of redirects")
+    report=commands.add_parser("report", help="run a report as a query")
+    report.add_argument("database")
+    report.add_argument("report", choices=["multiple", "lowercase", "double", "missing"])
+    args=parser.parse_args(argv)
+
+    if args.command == "build":
+        site={}
+        if ZipSite.IsZipSite(args.root):
+            ZipSite.LoadZip(site, args.root, args.workers)
+        else:
+            SiteLoader.LoadDirectory(site, args.root, args.workers)
+        SiteDatabase.Build(args.database, site).Close()
+        print(str(len(site))+" pages")
+        return
+
+    if not os.path.exists(args.database):
+        print("No database '"+args.database+"'", file=sys.stderr)
+        sys.exit(1)
+    with SiteDatabase(args.database) as db:
+        if args.command == "backlinks":
+            for page, raw in db.Backlinks(args.name):
+                print(page+"  <===  '"+raw+"'")
+        elif args.command == "spellings":
+            for raw, mediawiki, count in db.Spellings(args.name):
+                print("'"+raw+"'  (Mediawiki: "+mediawiki+")  "+str(count)+" pages")
+        elif args.command == "redirects":
+            for page in db.RedirectsTo(args.name, args.transitive):
+                print(page)
+        elif args.report == "multiple":
+            for group in db.MultipleForms():
+                print("\n"+group.Wikidot)
+                for form in group.Forms:
+                    print("  "+form.Mediawiki+":  "+",  ".join("'"+link.Raw+"' ("+str(len(link.Pages))+")" for link in form.Links))
+        elif args.report == "lowercase":
+            for page, redirect in db.LowercaseRedirects():
+                print(page+"  ==>  "+redirect)
+        elif args.report == "double":
+            for d in db.DoubleRedirects():
+                print("  ==>  ".join(d.Chain)+("  ==>  ("+d.Status+") "+d.End if d.End is not None else ""))
+        elif args.report == "missing":
+            for page, target in db.MissingRedirectTargets():
+                print(page+"  ==>  "+target)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+
+# Find the pages in a Wikidot site image on disk
+#
+# A page is a <name>.txt source file with a <name>.xml metadata file beside it.  (The loader reads <name>.xml, so its extension must be lowercase.)
+# DiscoverPages walks the whole tree under the site directory with os.scandir and generates the pages' names as it finds them, one directory at
+# a time, so the full list of files is never built.
+# The names are relative to the site directory (using "/" between directories), and are what the loader uses as the pages' keys.  The pages in
+# the top directory come first (in directory order), then those in each subdirectory in turn.
+#
+# Note that each page can also have a directory named <name> holding its attached files.  Those directories are walked like any other, but an
+# attachment is only taken as a page if it, too, is a .txt file with a matching .xml file.
+
+
+# *****************************************************************
+# The rules for which files and directories are pages
+class DiscoveryRules:
+    def __init__(self, excludePrefixes=("index_", "testing_alphanumeric"), excludeDirs=(), recurse=True, extension=".txt", companion=".xml"):
+        self.excludePrefixes=tuple(excludePrefixes)     # Page names starting with these are skipped
+        self.excludeDirs=set(excludeDirs)               # Directories with these names are not walked
+        self.recurse=recurse                            # If False, only the top directory is looked at
+        self.extension=extension.lower()                # The extension of a page's source file
+        self.companion=companion                        # The extension of the file which must accompany it (None if there needn't be one)
+
+    # -----------------------------------
+    # Is a name (without its extension) that of a page which we want?
+    def IncludePage(self, name):
+        return len(name) > 0 and not name.startswith(self.excludePrefixes)
+
+    # Should we walk a subdirectory?
+    def IncludeDir(self, name):
+        return self.recurse and name not in self.excludeDirs and not name.startswith(".")
+
+
+# The loader's rules: skip the index_ pages (index_people..., index_alphanumeric..., etc.) and Fancyclopedia's testing_alphanumeric... pages.
+# The same rules are used for a site directory and for a zipped backup (including by WikidotHelpers.InterestingFilenameZip), so that both give
+# the same pages.
+DefaultRules=DiscoveryRules()
+
+
+# *****************************************************************
+# Generate the names of the pages under root
+def DiscoverPages(root, rules=None):
+    if rules is None:
+        rules=DefaultRules
+    ext=rules.extension
+    extLen=len(ext)
+    companion=rules.companion
+
+    stack=[""]      # Directories still to be walked, relative to root
+    while len(stack) > 0:
+        rel=stack.pop()
+        try:
+            entries=os.scandir(os.path.join(root, rel) if rel != "" else root)
+        except OSError:
+            continue
+
+        sources=[]
+        others=set()
+        subdirs=[]
+        with entries:
+            for entry in entries:
+                name=entry.name
+                try:
+                    isDir=entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if isDir:
+                    if rules.IncludeDir(name):
+                        subdirs.append(name)
+                    continue
+                if name[-extLen:].lower() == ext:
+                    sources.append(name[:-extLen])
+                elif companion is not None:
+                    others.add(name)
+
+        prefix=rel+"/" if rel != "" else ""
+        for name in sources:
+            if rules.IncludePage(name) and (companion is None or name+companion in others):
+                yield prefix+name
+
+        for name in reversed(subdirs):      # Reversed so that they come off the stack in directory order
+            stack.append(prefix+name)
+
@@ -0,0 +1,114 @@
+import os
+import random
+import argparse
+import WikidotHelpers
+
+# Generate a synthetic Wikidot site image on disk, in the same layout LoadDirectory reads: <name>.txt (the source) and <name>.xml (the metadata,
+# written by WikidotHelpers.SaveMetadata) for each page.
+#
+# The knobs are:
+#   pages          -- the number of pages
+#   linksPerPage   -- the average number of links on a (non-redirect) page
+#   redirectRatio  -- the fraction of pages which are redirects
+#   chainDepth     -- the maximum length of a chain of redirects
+#   missingRatio   -- the fraction of redirects and links which point to pages that don't exist
+#   variantRatio   -- the fraction of links which use a case or punctuation variant of the page name rather than the page's title
+# The same arguments and seed always give the same site.
+
+_words=["fan", "zine", "con", "slan", "shack", "apa", "worldcon", "hugo", "fanac", "ghod", "bheer", "egoboo", "gafia", "fiawol", "mimeo",
+        "hekto", "corflu", "ditto", "loc", "crifanac", "smof", "neo", "bnf", "trufan", "fugghead", "tucker", "bloch", "ackerman", "willis", "laney"]
+
+
+# *****************************************************************
+# Make a random page title like "Gafia Mimeo 1947"
+def _MakeTitle(i, rng):
+    words=[rng.choice(_words).capitalize() for j in range(rng.randint(1, 3))]
+    return " ".join(words)+" "+str(i)
+
+
+# *****************************************************************
+# Make a variant of a page name, of the kinds that Wikidot treats as the same page and Mediawiki may not
+def _MakeVariant(title, rng):
+    kind=rng.randrange(7)
+    if kind == 0:
+        return title.lower()
+    if kind == 1:
+        return title.upper()
+    if kind == 2:
+        return title.replace(" ", "_")
+    if kind == 3:
+        return title.replace(" ", "-")
+    if kind == 4:
+        return "  "+title+" "
+    if kind == 5:
+        return title.replace(" ", "  ")
+    return title+rng.choice(["!", ".", "'s", "?"])
+
+
+# *****************************************************************
+# Generate the site.  Returns a dictionary of statistics about what was generated.
+def GenerateSite(dir, pages=1000, linksPerPage=20, redirectRatio=0.1, chainDepth=3, missingRatio=0.02, variantRatio=0.2, seed=0):
+    rng=random.Random(seed)
+    os.makedirs(dir, exist_ok=True)
+
+    titles=[_MakeTitle(i, rng) for i in range(pages)]
+    names=[WikidotHelpers.CannonicizeFast(t)[0] for t in titles]
+
+    # Decide which pages are redirects, and chain some of them together.
+    # Redirects point at another redirect (extending a chain) until the chain reaches chainDepth; then they point at a real page.
+    isRedirect=[rng.random() < redirectRatio for i in range(pages)]
+    realPages=[i for i in range(pages) if not isRedirect[i]] or [0]
+    depth={}
+    redirectTargets={}
+    redirectIds=[i for i in range(pages) if isRedirect[i]]
+    for i in redirectIds:
+        candidates=[j for j in (rng.choice(redirectIds) for k in range(3)) if j != i and j in depth and depth[j] < chainDepth]
+        if len(candidates) > 0 and rng.random() < 0.5:
+            target=candidates[0]
+            depth[i]=depth[target]+1
+        else:
+            target=rng.choice(realPages)
+            depth[i]=1
+        redirectTargets[i]=target
+
+    def LinkText(target):
+        if rng.random() < missingRatio:
+            return "Missing "+_MakeTitle(pages+rng.randrange(pages), rng)
+        if rng.random() < variantRatio:
+            return _MakeVariant(titles[target], rng)
+        return titles[target]
+
+    stats={"pages": pages, "redirects": len(redirectIds), "links": 0, "maxChain": max(depth.values()) if len(depth) > 0 else 0}
+    for i in range(pages):
+        if isRedirect[i]:
+            source='[[module Redirect destination="'+LinkText(redirectTargets[i])+'"]]'
+        else:
+            parts=[]
+            for j in range(max(0, int(rng.gauss(linksPerPage, linksPerPage/4)))):
+                link=LinkText(rng.randrange(pages))
+                if rng.random() < 0.3:
+                    link+="|"+rng.choice(_words)
+                parts.append("Some text about "+rng.choice(_words)+" [[["+link+"]]]")
+                stats["links"]+=1
+            source="\n".join(parts)
+        pathname=os.path.join(dir, names[i])
+        with open(pathname+".txt", "w", encoding="cp437", errors="replace") as f:
+            f.write(source)
+        WikidotHelpers.SaveMetadata(pathname, {"title": titles[i], "tags": rng.sample(_words, rng.randint(0, 3)), "updated_at": "2019-02-07 12:00:00"})
+    return stats
+
+
+# *****************************************************************
+# Usage:  python SiteGenerator.py <dir> [--pages N] [--links N] ...
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser(description="Generate a synthetic Wikidot site image")
+    parser.add_argument("dir")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--links", type=int, default=20, help="average links per page")
+    parser.add_argument("--redirects", type=float, default=0.1, help="fraction of pages which are redirects")
+    parser.add_argument("--chain", type=int, default=3, help="maximum redirect chain depth")
+    parser.add_argument("--missing", type=float, default=0.02, help="fraction of links to pages which don't exist")
+    parser.add_argument("--variants", type=float, default=0.2, help="fraction of links which are case/punctuation variants")
+    parser.add_argument("--seed", type=int, default=0)
+    args=parser.parse_args()
+    print(GenerateSite(args.dir, args.pages, args.links, args.redirects, args.chain, args.missing, args.variants, args.seed))
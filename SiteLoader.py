@@ -0,0 +1,290 @@
+import os
+import queue
+import threading
+import collections
+import multiprocessing
+import PageCache
+import Metrics
+import LinkTokenizer
+import MetadataReader
+import SiteDiscovery
+import WikidotHelpers
+
+# Load the pages of a Wikidot site image on disk into a site dictionary of PageInfo tuples
+# The pages are found by SiteDiscovery and streamed through a pipeline which overlaps finding, reading, parsing and indexing them.
+# The parsing can be done serially or spread across a pool of worker processes.  Both produce exactly the same site dictionary.
+# If a PageCache is supplied, pages whose files have not changed since the last run are taken from the cache rather than being re-parsed.
+
+
+#*******************************************************************************
+# Define the PageInfo tuple
+PageInfo=collections.namedtuple("PageInfo", "Title, CanName, Tags, Links, Redirect")
+
+# The version of the rules used to turn a page into a PageInfo.
+# Bump this whenever ParsePage changes what it extracts (e.g., the link syntax it recognizes) so that cached PageInfos are discarded.
+LinkRulesVersion=2
+
+
+#==================================================================
+# Load the pages in the site directory
+# All the pages in the tree under dir are loaded (see SiteDiscovery); rules is an optional SiteDiscovery.DiscoveryRules to select them.
+# workers is the number of processes to use: 1 (or None) loads the pages serially in this process; 0 means use one worker per CPU
+# cache is an optional PageCache
+# queueSize limits the number of pages in flight at once (see LoadPagesPipelined)
+def LoadDirectory(site, dir, workers=1, cache=None, rules=None, queueSize=256):
+    with Metrics.metrics.Phase("LoadDirectory"):
+        _LoadDirectory(site, dir, workers, cache, rules, queueSize)
+
+def _LoadDirectory(site, dir, workers, cache, rules, queueSize):
+    if not os.path.isdir(dir):
+        return
+
+    if cache is not None:
+        cache.CheckRules(LinkRulesVersion)
+
+    if workers == 0:
+        workers=os.cpu_count() or 1
+    for fname, pageInfo in LoadPagesPipelined(dir, SiteDiscovery.DiscoverPages(dir, rules), workers, cache, queueSize):
+        site[fname]=pageInfo
+        CountPage(pageInfo)
+
+
+#==================================================================
+# The loading pipeline
+# Generate (fname, PageInfo) for each of the pages named by fnames (which may be a generator, such as SiteDiscovery.DiscoverPages), in order.
+#
+# The stages run at the same time, connected by bounded queues, so however big the site is only about queueSize pages are in flight at once:
+#   A reader thread pulls the page names, looks them up in the cache, and (when loading serially) reads the files of the pages which need parsing
+#   The pages which need parsing are parsed: here, or in batches by a pool of worker processes (which also read the files)
+#   The results are handed back to the caller for indexing (e.g., adding to site).  Newly parsed pages are stored in the cache here, too.
+# Only the reader thread calls cache.Lookup and only this thread calls cache.Store, so the two don't interfere.
+def LoadPagesPipelined(dirpath, fnames, workers=1, cache=None, queueSize=256):
+    readQueue=queue.Queue(queueSize)
+    stop=threading.Event()
+    parallel=workers is not None and workers > 1
+    reader=threading.Thread(target=_ReadPages, args=(dirpath, fnames, cache, not parallel, readQueue, stop), daemon=True)
+    reader.start()
+    try:
+        if parallel:
+            yield from _ParsePagesInPool(dirpath, _Drain(readQueue), workers, cache, queueSize)
+        else:
+            yield from _ParsePagesSerially(dirpath, _Drain(readQueue), cache)
+    finally:
+        stop.set()      # In case we're stopping early: don't leave the reader waiting for room in the queue
+        reader.join()
+
+# -----------------------------------
+_endOfPages=object()
+
+class _ReaderFailure:
+    def __init__(self, exception):
+        self.exception=exception
+
+# -----------------------------------
+# The reader thread.  Each page is put on the queue as (fname, PageInfo from the cache or None, stamp, (xmlBytes, sourceBytes) or None).
+def _ReadPages(dirpath, fnames, cache, readFiles, readQueue, stop):
+    try:
+        for fname in fnames:
+            pageInfo=None
+            stamp=None
+            if cache is not None:
+                pageInfo, stamp=cache.Lookup(dirpath, fname)
+            files=None
+            if pageInfo is None and readFiles:
+                files=ReadPageFiles(dirpath, fname)
+            if not _Put(readQueue, (fname, pageInfo, stamp, files), stop):
+                return
+        item=_endOfPages
+    except BaseException as e:
+        item=_ReaderFailure(e)      # Pass the exception on, to be raised in the consumer's thread
+    _Put(readQueue, item, stop)
+
+def _Put(readQueue, item, stop):
+    while not stop.is_set():
+        try:
+            readQueue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+# Generate the items the reader thread puts on the queue
+def _Drain(readQueue):
+    while True:
+        item=readQueue.get()
+        if item is _endOfPages:
+            return
+        if isinstance(item, _ReaderFailure):
+            raise item.exception
+        yield item
+
+# -----------------------------------
+# Record a newly parsed page
+def _Parsed(cache, dirpath, fname, stamp, pageInfo, digest, bytesRead):
+    Metrics.metrics.Count("pagesParsed")
+    Metrics.metrics.Count("bytesRead", bytesRead)
+    if cache is not None:
+        cache.Store(dirpath, fname, stamp, digest, pageInfo)
+
+# -----------------------------------
+# Both parsing stages work on batches of pages
+_batchSize=16
+
+# The serial parsing stage
+# The pages are taken in batches of _batchSize, and each batch is parsed within a single ParsePages phase: timing each page separately would cost
+# a noticeable fraction of the time it takes to parse it.
+def _ParsePagesSerially(dirpath, items, cache):
+    batch=[]
+    for item in items:
+        batch.append(item)
+        if len(batch) >= _batchSize:
+            yield from _ParseBatch(dirpath, batch, cache)
+            batch=[]
+    if len(batch) > 0:
+        yield from _ParseBatch(dirpath, batch, cache)
+
+def _ParseBatch(dirpath, batch, cache):
+    results=[]
+    with Metrics.metrics.Phase("ParsePages"):
+        for fname, pageInfo, stamp, files in batch:
+            if pageInfo is None:
+                pageInfo=ParsePage(fname, *files)
+                _Parsed(cache, dirpath, fname, stamp, pageInfo, PageCache.PageDigest(*files), FilesLength(*files))
+            results.append((fname, pageInfo))
+    return results
+
+# -----------------------------------
+# The parallel parsing stage
+# The pages needing parsing are sent to the pool in batches (big enough to amortize the interprocess overhead).  The results are generated in
+# the original order, waiting for each batch as it reaches the front; the number of pages waiting is bounded by window.
+class _Batch:
+    def __init__(self):
+        self.fnames=[]
+        self.result=None
+        self.results=None
+
+    def Submit(self, pool, dirpath):
+        self.result=pool.apply_async(ReadPagesAndDigests, (dirpath, self.fnames))
+
+    def Get(self, i):
+        if self.results is None:
+            self.results=self.result.get()
+        return self.results[i]
+
+def _ParsePagesInPool(dirpath, items, workers, cache, window):
+    window=max(window, 2*workers*_batchSize)     # Enough to keep all the workers busy
+    pool=None
+    pending=collections.deque()     # (fname, PageInfo from the cache, stamp, batch, index in batch)
+    batch=_Batch()
+
+    def Finish(slot):
+        fname, pageInfo, stamp, slotBatch, i=slot
+        if slotBatch is not None:
+            if slotBatch.result is None:
+                slotBatch.Submit(pool, dirpath)
+            pageInfo, digest, bytesRead=slotBatch.Get(i)
+            _Parsed(cache, dirpath, fname, stamp, pageInfo, digest, bytesRead)
+        return fname, pageInfo
+
+    try:
+        with Metrics.metrics.Phase("ParsePagesParallel"):
+            for fname, pageInfo, stamp, files in items:
+                if pageInfo is not None:
+                    pending.append((fname, pageInfo, stamp, None, None))
+                else:
+                    if pool is None:
+                        pool=multiprocessing.Pool(workers)
+                    pending.append((fname, None, stamp, batch, len(batch.fnames)))
+                    batch.fnames.append(fname)
+                    if len(batch.fnames) >= _batchSize:
+                        batch.Submit(pool, dirpath)
+                        batch=_Batch()
+                while len(pending) > window:
+                    yield Finish(pending.popleft())
+            while len(pending) > 0:
+                yield Finish(pending.popleft())
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+#==================================================================
+# Count a loaded page and its links in the metrics
+def CountPage(pageInfo):
+    Metrics.metrics.Count("pages")
+    if pageInfo.Links is not None:
+        Metrics.metrics.Count("links", len(pageInfo.Links))
+    else:
+        Metrics.metrics.Count("redirects")
+
+
+#==================================================================
+# Read and parse a single page, returning its PageInfo, the digest of its files (for the PageCache) and the number of bytes read
+def ReadPageAndDigest(dirpath, fname):
+    xmlBytes, sourceBytes=ReadPageFiles(dirpath, fname)
+    return ParsePage(fname, xmlBytes, sourceBytes), PageCache.PageDigest(xmlBytes, sourceBytes), FilesLength(xmlBytes, sourceBytes)
+
+# The same, for a list of pages.  (This is what the worker processes run.)
+def ReadPagesAndDigests(dirpath, fnames):
+    return [ReadPageAndDigest(dirpath, fname) for fname in fnames]
+
+
+#==================================================================
+# Read the raw contents of a page's <name>.xml and <name>.txt files
+# dirpath is normally the site directory, but can instead be a page source object with a ReadFiles(fname) method, such as a ZipSite.ZipSource.
+# (A page source object can be passed anywhere a dirpath is, except when a PageCache is used: the cache works on files on disk.)
+# A page source object may give None for the metadata of a page which has none (see ParsePage).
+def ReadPageFiles(dirpath, fname):
+    if not isinstance(dirpath, str):
+        return dirpath.ReadFiles(fname)
+    pathname=os.path.join(dirpath, fname)
+    with open(pathname+".xml", "rb") as f:
+        xmlBytes=f.read()
+    with open(pathname+".txt", "rb") as f:
+        sourceBytes=f.read()
+    return xmlBytes, sourceBytes
+
+# The number of bytes in a page's files
+def FilesLength(xmlBytes, sourceBytes):
+    return (len(xmlBytes) if xmlBytes is not None else 0)+len(sourceBytes)
+
+
+#==================================================================
+# Turn the contents of a page's files into its PageInfo
+# xmlBytes is None for a page with no metadata, such as a page in a real Wikidot backup, which holds only the pages' sources.  Such a page has
+# no tags, and its source is UTF-8.
+# A page with no title (no metadata, or metadata without a <title>) is titled with its name, with the category marker of a backup's file name
+# turned back into a colon.
+def ParsePage(fname, xmlBytes, sourceBytes):
+
+    if xmlBytes is None:
+        title=None
+        tags=None
+        source=sourceBytes.decode("utf-8")
+    else:
+        # Read the tags and title from the xml
+        title, tags=MetadataReader.ReadMetadataBytes(xmlBytes)
+        source=sourceBytes.decode("cp437")  # Reading in binary and doing the funny decode is to handle special characters embedded in some sources.
+    if title is None:
+        title=WikidotHelpers.ConvertZipCategoryMarker("source/"+fname)[7:]
+
+    #print(fname)
+
+    def IsRedirect(pageText):
+        pageText=pageText.strip()  # Remove leading and trailing whitespace
+        if pageText.lower().startswith('[[module redirect destination="') and pageText.endswith('"]]'):
+            return pageText[31:].rstrip('"]')
+        return None
+
+    # First, check to see if this is a redirect.  If it is, we're done.
+    redirect=IsRedirect(source)
+    if redirect:
+        return PageInfo(title, fname, tags, None, redirect)
+
+    # Now we scan the source for links.
+    # A link is one of these formats:
+    #   [[[link]]]
+    #   [[[link|display text]]]
+    links=LinkTokenizer.PageLinks(source)    # Links is a *set* of all the unique pages pointed to by this page. (We use the set because we don't care about order, but do care about duplicates.)
+
+    return PageInfo(title, fname, tags, links, None)
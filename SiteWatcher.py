@@ -0,0 +1,307 @@
+import os
+import sys
+import time
+import bisect
+import argparse
+import collections
+import xml.etree.ElementTree as ET
+import WikidotHelpers
+import LinkGroups
+import Redirects
+import PageCache
+import SiteDiscovery
+import SiteLoader
+import CaseAnalysis
+import Metrics
+
+# Watch a site directory and keep the analysis up to date as pages are edited
+#
+# The site is loaded once.  After that, each Poll() rescans the directory, comparing each page's file stamps (sizes and modification times of
+# its .txt and .xml) with those seen last time, and deals with just the pages which were changed, added or deleted:
+#   Each changed or added page is reread and reparsed, and deleted pages are dropped from site
+#   A page which can't be parsed (e.g., because it is still being written) is left as it was, and is tried again at the next poll
+#   The differences between the page's old and new links are applied to inverseSite: its old backlinks are removed and its new ones added
+#   The canonical groups (see LinkGroups) of the link texts which gained or lost pages are regrouped, and the redirect chains passing through
+#   any of the pages are re-resolved (see Redirects.RedirectResolver.Update)
+#   The report entries for those groups and chains are rebuilt, and the ones which differ from before are returned as ReportChanges
+# Each page's change is applied to site, inverseSite and the stamps together, or not at all.  Added pages take their places in the order the
+# loader would give them (the order of the scan), so site and inverseSite's lists are always in the order a fresh load would give.
+#
+# Usage:  python SiteWatcher.py <site directory> [--interval seconds]
+
+# A change to one entry of a report.  Key is the Wikidot form (for the multiple forms report) or the redirect page (for the others).
+# Old and New are the entry's lines before and after the change (None if the entry didn't, or no longer does, exist).
+ReportChange=collections.namedtuple("ReportChange", "Report, Key, Old, New")
+
+
+# *****************************************************************
+class SiteWatcher:
+    def __init__(self, root, rules=None, cache=None, workers=1):
+        self.root=root
+        self.rules=rules
+        self.cache=cache
+
+        # Take the stamps before loading, so that a page changed while we're loading is picked up by the first poll
+        self.stamps=self._Stamps()
+        self.site={}
+        if cache is not None:
+            cache.CheckRules(SiteLoader.LinkRulesVersion)
+        if workers == 0:
+            workers=os.cpu_count() or 1
+        for fname, pageInfo in SiteLoader.LoadPagesPipelined(root, list(self.stamps), workers, cache):
+            self.site[fname]=pageInfo
+        self.order={fname: i for i, fname in enumerate(self.site)}     # The position of each page in site, to keep inverseSite's lists in site order
+
+        self.inverseSite=CaseAnalysis.BuildInverseSite(self.site)
+        self.forms={}           # Link text -> (Wikidot form, Mediawiki form)
+        self.formIndex={}       # Wikidot form -> the set of link texts with that form
+        self._AddForms(list(self.inverseSite))
+        self.redirects=Redirects.RedirectResolver(self.site)
+
+        # The current entries of each report, by key
+        self.entries={"multiple": {}, "lowercase": {}, "double": {}, "missing": {}}
+        for group in LinkGroups.MultipleFormGroups(LinkGroups.GroupLinks(self.inverseSite)):
+            self.entries["multiple"][group.Wikidot]=CaseAnalysis.FormatMultipleForms(group)
+        for key in self.site:
+            self._UpdateRedirectEntries(key)
+
+    # -----------------------------------
+    # The stamps of all the pages currently in the directory
+    def _Stamps(self):
+        stamps={}
+        for fname in SiteDiscovery.DiscoverPages(self.root, self.rules):
+            stamp=PageCache.PageStamp(os.path.join(self.root, fname))
+            if stamp is not None:       # (The page vanished while we were looking at it)
+                stamps[fname]=stamp
+        return stamps
+
+    # -----------------------------------
+    # Rescan the directory.  Returns the lists of (added, changed, deleted) pages, without doing anything about them.
+    def Scan(self):
+        return self._Compare(self._Stamps())
+
+    def _Compare(self, stamps):
+        added=[f for f in stamps if f not in self.stamps]
+        changed=[f for f in stamps if f in self.stamps and stamps[f] != self.stamps[f]]
+        deleted=[f for f in self.stamps if f not in stamps]
+        return added, changed, deleted
+
+    # -----------------------------------
+    # Rescan the directory and bring everything up to date.  Returns a list of ReportChanges.
+    def Poll(self):
+        stamps=self._Stamps()
+        added, changed, deleted=self._Compare(stamps)
+        if len(added)+len(changed)+len(deleted) == 0:
+            return []
+        return self.Apply(added, changed, deleted, list(stamps))
+
+    # -----------------------------------
+    # order is the list of all the pages in the order the loader would take them (as given by a scan); the added pages are placed by it.  If it
+    # isn't given, the directory is scanned for it.
+    @Metrics.Timed("WatchUpdate")
+    def Apply(self, added, changed, deleted, order=None):
+        touchedLinks=set()      # The link texts which gained or lost pages
+
+        for fname in deleted:
+            touchedLinks|=self._SetLinks(fname, _PageLinks(self.site.pop(fname, None)), set())
+            self.stamps.pop(fname, None)
+            self.order.pop(fname, None)
+
+        if len(added) > 0:
+            if order is None:
+                order=list(SiteDiscovery.DiscoverPages(self.root, self.rules))
+            self._Reorder(order)
+
+        for fname in added+changed:
+            old=self.site.get(fname)
+            stamp=PageCache.PageStamp(os.path.join(self.root, fname))
+            try:
+                pageInfo=self._ReadPage(fname, stamp) if stamp is not None else None
+            except OSError:         # The page was deleted after we scanned the directory
+                pageInfo=None
+            except (ET.ParseError, ValueError):         # The page is only partly written: try it again next time
+                Metrics.metrics.Count("watchUnparsablePages")
+                continue
+            if pageInfo is None:
+                self.site.pop(fname, None)
+                self.stamps.pop(fname, None)
+                touchedLinks|=self._SetLinks(fname, _PageLinks(old), set())
+                continue
+            self.site[fname]=pageInfo
+            self.stamps[fname]=stamp
+            touchedLinks|=self._SetLinks(fname, _PageLinks(old), _PageLinks(pageInfo))
+        if len(added) > 0 and not self._SiteInOrder():
+            self._SortSite()
+
+        reportChanges=[]
+
+        # Regroup the canonical groups which were touched
+        self._AddForms([link for link in touchedLinks if link not in self.forms])
+        touchedForms={self.forms[link][0] for link in touchedLinks}
+        for link in touchedLinks:
+            if link not in self.inverseSite:
+                self._RemoveForm(link)
+        for form in sorted(touchedForms):
+            reportChanges.extend(self._SetEntry("multiple", form, self._MultipleFormsEntry(form)))
+
+        # Re-resolve the redirect chains which were touched
+        for key in sorted(self.redirects.Update(set(added+changed+deleted)), key=lambda k: self.order.get(k, len(self.order))):
+            reportChanges.extend(self._UpdateRedirectEntries(key))
+        return reportChanges
+
+    # -----------------------------------
+    # Read and parse a page (or take it from the cache), without touching site
+    def _ReadPage(self, fname, stamp):
+        if self.cache is not None:
+            pageInfo, stamp=self.cache.Lookup(self.root, fname)
+            if pageInfo is not None:
+                return pageInfo
+        xmlBytes, sourceBytes=SiteLoader.ReadPageFiles(self.root, fname)
+        pageInfo=SiteLoader.ParsePage(fname, xmlBytes, sourceBytes)
+        if self.cache is not None:
+            self.cache.Store(self.root, fname, stamp, PageCache.PageDigest(xmlBytes, sourceBytes), pageInfo)
+        return pageInfo
+
+    # -----------------------------------
+    # Renumber the pages by their positions in order (a list of all the pages, including any which are about to be added).  If that changes the
+    # order of the pages already in site, inverseSite's lists are re-sorted to match.  (Apply puts site itself in order once the pages are added.)
+    def _Reorder(self, order):
+        self.order={fname: i for i, fname in enumerate(order)}
+        for fname in self.site:
+            if fname not in self.order:         # (It vanished after the scan, and will be found to be deleted next time)
+                self.order[fname]=len(self.order)
+        if not self._SiteInOrder():
+            for pages in self.inverseSite.values():
+                pages.sort(key=self.order.__getitem__)
+
+    # Is site in order?
+    def _SiteInOrder(self):
+        previous=-1
+        for fname in self.site:
+            if self.order[fname] < previous:
+                return False
+            previous=self.order[fname]
+        return True
+
+    # Put site in order.  (It's re-sorted in place, as the RedirectResolver shares it.)
+    def _SortSite(self):
+        items=sorted(self.site.items(), key=lambda item: self.order[item[0]])
+        self.site.clear()
+        self.site.update(items)
+
+    # -----------------------------------
+    # Replace a page's links in inverseSite.  Returns the set of link texts which changed.
+    def _SetLinks(self, fname, oldLinks, newLinks):
+        for link in oldLinks-newLinks:
+            pages=self.inverseSite[link]
+            pages.remove(fname)
+            if len(pages) == 0:
+                del self.inverseSite[link]
+        for link in newLinks-oldLinks:
+            pages=self.inverseSite.setdefault(link, [])
+            bisect.insort(pages, fname, key=self.order.__getitem__)
+        return oldLinks ^ newLinks
+
+    # -----------------------------------
+    # Record the canonical forms of some link texts
+    def _AddForms(self, links):
+        for link, wikidot, mediawiki in zip(links, WikidotHelpers.CannonicizeBatch(links), map(WikidotHelpers.MediawikiCanonicizeFast, links)):
+            self.forms[link]=(wikidot, mediawiki)
+            self.formIndex.setdefault(wikidot, set()).add(link)
+
+    def _RemoveForm(self, link):
+        wikidot=self.forms.pop(link)[0]
+        links=self.formIndex[wikidot]
+        links.discard(link)
+        if len(links) == 0:
+            del self.formIndex[wikidot]
+
+    # -----------------------------------
+    # The entry in the multiple forms report for a Wikidot form (None if it doesn't have more than one Mediawiki form)
+    def _MultipleFormsEntry(self, wikidot):
+        links=self.formIndex.get(wikidot)
+        if links is None:
+            return None
+        records=sorted((wikidot, self.forms[link][1], link) for link in links)
+        group=next(LinkGroups.GroupSortedRecords((w, m, r, self.inverseSite[r]) for w, m, r in records))
+        if len(group.Forms) < 2:
+            return None
+        return CaseAnalysis.FormatMultipleForms(group)
+
+    # -----------------------------------
+    # Rebuild the redirect report entries for a page.  Returns the ReportChanges.
+    def _UpdateRedirectEntries(self, key):
+        val=self.site.get(key)
+        lowercase=None
+        double=None
+        missing=None
+        if val is not None and val.Redirect is not None:
+            if CaseAnalysis.IsLowercaseRedirect(val.Redirect):
+                lowercase=[CaseAnalysis.FormatLowercaseRedirect(key, val.Redirect)]
+            d=CaseAnalysis.DoubleRedirectOf(self.redirects, key)
+            if d is not None:
+                double=[CaseAnalysis.FormatDoubleRedirect(self.site, d)]
+            target=self.redirects.Target(key)
+            if target not in self.site:
+                missing=[CaseAnalysis.FormatMissingRedirectTarget(self.site, key, target)]
+        return self._SetEntry("lowercase", key, lowercase)+self._SetEntry("double", key, double)+self._SetEntry("missing", key, missing)
+
+    # -----------------------------------
+    # Set a report entry, returning a list of the ReportChange (if it changed)
+    def _SetEntry(self, report, key, lines):
+        entries=self.entries[report]
+        old=entries.get(key)
+        if lines is None:
+            entries.pop(key, None)
+        else:
+            entries[key]=lines
+        if old == lines:
+            return []
+        return [ReportChange(report, key, old, lines)]
+
+    # -----------------------------------
+    # Poll every interval seconds, writing the report changes to f, until interrupted (or until polls polls have been done)
+    def Watch(self, interval=2.0, f=sys.stdout, polls=None):
+        count=0
+        while polls is None or count < polls:
+            for change in self.Poll():
+                PrintReportChange(change, f)
+            f.flush()
+            count+=1
+            if polls is None or count < polls:
+                time.sleep(interval)
+
+
+# -----------------------------------
+# The links out of a page, as in inverseSite (a redirect links to its destination)
+def _PageLinks(pageInfo):
+    if pageInfo is None:
+        return set()
+    if pageInfo.Links is not None:
+        return set(pageInfo.Links)
+    if pageInfo.Redirect is not None:
+        return {pageInfo.Redirect}
+    return set()
+
+# -----------------------------------
+def PrintReportChange(change, f):
+    for line in change.Old or []:
+        print("["+change.Report+"] - "+line, file=f)
+    for line in change.New or []:
+        print("["+change.Report+"] + "+line, file=f)
+
+
+# *****************************************************************
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser(description="Watch a Wikidot site directory, reporting the changes to the reports as pages are edited")
+    parser.add_argument("root", help="the site directory")
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between polls")
+    parser.add_argument("--workers", type=int, default=0, help="processes used for the initial load")
+    args=parser.parse_args()
+
+    watcher=SiteWatcher(args.root, workers=args.workers)
+    print("Watching "+str(len(watcher.site))+" pages")
+    try:
+        watcher.Watch(args.interval)
+    except KeyboardInterrupt:
+        pass
@@ -1,4 +1,7 @@
+import re
 import xml.etree.ElementTree as ET
+import SiteDiscovery
+from collections import OrderedDict
 
 # A package to support API access to Wikidot
 
@@ -7,7 +10,6 @@ import xml.etree.ElementTree as ET
 # The cannonicized name turns all spans of non-alphanumeric characters into a single hyphen, drops all leading and trailing hyphens
 # and turns all alphabetic characters to lower case
 # A Raw name is a single string possibly including a category: prefix
-cannonicalToReal = {}   # A dictionary which lets us go from cannonical names back to real names
 
 
 # We need to convert a string to Wikidot's cannonical form: All lower case; All spans of special characters reduced to a hyphen; No leading ro trailing hyphens.
@@ -38,9 +40,8 @@ def CannonicizeString(name):
 # Take a raw name (mixed case, special characters, a potential category, etc.) and turn it into a properly formatted cannonicized name:
 #       Either "<category>:<name>" or, when there is no category, just "<name>"
 #       In both cases, the <> text is cannonicized
-def Cannonicize(pageNameZip):
-    if pageNameZip == None:
-        return None
+# Returns both the cannonicized name and the lower-cased raw name it came from.  (This does no caching -- use Cannonicize() for that.)
+def CannonicizeUncached(pageNameZip):
     pageName = pageNameZip.lower()
 
     # Split out the category, if any.
@@ -55,26 +56,204 @@ def Cannonicize(pageNameZip):
     else:
         canName=CannonicizeString(splitName[0])+":"+CannonicizeString(splitName[1])
         name=splitName[0]+":"+splitName[1]
+    return canName, name
+
+
+# *****************************************************************
+# Generate the Wikimedia canonicized form of a name
+# Note that for now we are ignoring the possibility of namespace: prefixes
+# (This does no caching -- use MediawikiCanonicize() for that.)
+def MediawikiCanonicizeUncached(name):
+    if name is None or name == "":
+        return name
+
+    # Underscores are treated as spaces
+    name=name.replace("_", " ")
 
-    # And save the cannocized and raw versions of the name in a reverse-lookup dictionary
-    if cannonicalToReal.get(canName) == None:
-        cannonicalToReal[canName]=name  # Add this cannonical-to-real conversion to the dictionary
-    return canName
+    # Leading and trailing spaces and underscores are ignored
+    name=name.strip()
+
+    # Multiple consecutive spaces are treated as a single space
+    while "  " in name:
+        name=name.replace("  ", " ")
+
+    # Wikimedia always treats the 1st character as capital
+    name=name[:1].upper()+name[1:]
+
+    return name
+
+
+# *****************************************************************
+# Batch canonicization
+# These give exactly the same results as CannonicizeUncached(), but do the work with precompiled regular expressions rather than by looping over
+# the characters of each name in Python.
+# There is no batch version of MediawikiCanonicizeUncached(): it is already just a few C-level string calls per name, and joining the names into
+# one string to do those calls once costs more than it saves.  So lists of names are put through MediawikiCanonicizeFast() one at a time.
+
+_alnumRuns=re.compile(r"(?:[^\W_]|:)+")   # A run of alphanumerics (and ":", the honorary alphanumeric).  [^\W_] is exactly the characters for which isalnum() is true.
+_junkRuns=re.compile(r"(?:[^\w:\0]|_)+")  # A run of anything but alphanumerics, ":" and the NUL used to separate names in a batch
+_asciiJunkToSpace=str.maketrans({chr(i): " " for i in range(128) if not (chr(i).isalnum() or chr(i) in ":\0")})
+
+# -----------------------------------
+# Return the Wikidot cannonical form of a raw name and the lower-cased raw name it came from
+# Joining the runs of alphanumerics with hyphens turns each span of junk into one hyphen and drops leading and trailing junk, just as CannonicizeString() does.
+def CannonicizeFast(pageNameZip):
+    pageName=pageNameZip.lower()
+    category, colon, rest=pageName.partition(":")
+    if not colon:
+        return "-".join(_alnumRuns.findall(category)), category
+    rest=rest.replace(":", " ")   # Assume first colon is the category divider.  The rest will eventually be ignored
+    return "-".join(_alnumRuns.findall(category))+":"+"-".join(_alnumRuns.findall(rest)), category+":"+rest
+
+# -----------------------------------
+# Return the Mediawiki canonical form of a name (see above: the plain version is as fast as it gets)
+MediawikiCanonicizeFast=MediawikiCanonicizeUncached
+
+# -----------------------------------
+# Canonicize a whole list of names at once.  None stays None.
+# The names are joined into one string (separated by NULs) so that the lower-casing and the conversion of junk characters to spaces happen in a
+# single pass over all of them: a translation table if everything is ASCII, otherwise a regular expression.  The per-name work that's left is
+# just "-".join(name.split()), which collapses the runs of junk to single hyphens and drops leading and trailing junk.
+# (If a name contains a NUL itself, we fall back to doing the names one at a time.)
+def CannonicizeBatch(names):
+    if len(names) == 0:
+        return []
+    joined="\0".join("" if n is None else n for n in names).lower()
+    if joined.count("\0") != max(0, len(names)-1):
+        return [None if n is None else CannonicizeFast(n)[0] for n in names]
+
+    if joined.isascii():
+        joined=joined.translate(_asciiJunkToSpace)
+    else:
+        joined=_junkRuns.sub(" ", joined)
+    out=["-".join(c.split()) if ":" not in c else _CategoryFixup(c) for c in joined.split("\0")]
+    if None in names:
+        out=[None if n is None else c for n, c in zip(names, out)]
+    return out
+
+# A name with a category needs its two parts dealt with separately, and any colons after the first are junk
+def _CategoryFixup(canName):
+    category, colon, rest=canName.partition(":")
+    return "-".join(category.split())+":"+"-".join(rest.replace(":", " ").split())
+
+
+# *****************************************************************
+# A bounded cache of the Wikidot and Mediawiki canonical forms of names.
+# The same names get canonicized over and over (every sort, every report), so we remember the results.  Each of the caches holds at most
+# maxSize entries; when one is full, the least recently used entry is dropped.
+# It also holds the reverse-lookup index from Wikidot canonical names back to the real names they came from.  The index is also limited to
+# maxSize entries, and also drops its least recently used entry when full.
+class CanonicalizationCache:
+    def __init__(self, maxSize=200000):
+        self.maxSize=maxSize
+        self.wikidot=OrderedDict()
+        self.mediawiki=OrderedDict()
+        self.cannonicalToReal=OrderedDict()   # The reverse-lookup index, which lets us go from cannonical names back to real names
+        self.Hits=0
+        self.Misses=0
+
+    # -----------------------------------
+    def Clear(self):
+        self.wikidot.clear()
+        self.mediawiki.clear()
+        self.cannonicalToReal.clear()
+        self.Hits=0
+        self.Misses=0
+
+    # -----------------------------------
+    # Return the Wikidot cannonical form of a raw name
+    def Cannonicize(self, pageNameZip):
+        if pageNameZip == None:
+            return None
+        canName=self.wikidot.get(pageNameZip)
+        if canName is not None:
+            self.Hits+=1
+            self.wikidot.move_to_end(pageNameZip)
+            return canName
+
+        self.Misses+=1
+        canName, name=CannonicizeFast(pageNameZip)
+        self._Remember(self.wikidot, pageNameZip, canName)
+
+        # And save the cannocized and raw versions of the name in the reverse-lookup index
+        if self.cannonicalToReal.get(canName) == None:
+            self._Remember(self.cannonicalToReal, canName, name)  # Add this cannonical-to-real conversion to the index
+        return canName
+
+    # -----------------------------------
+    # Return the Mediawiki canonical form of a raw name
+    def MediawikiCanonicize(self, name):
+        if name is None or name == "":
+            return name
+        canName=self.mediawiki.get(name)
+        if canName is not None:
+            self.Hits+=1
+            self.mediawiki.move_to_end(name)
+            return canName
+
+        self.Misses+=1
+        canName=MediawikiCanonicizeFast(name)
+        self._Remember(self.mediawiki, name, canName)
+        return canName
+
+    # -----------------------------------
+    # Potentially add this entry to the reverse-lookup index.  We prefer the form with the most capital letters.
+    def AddUncannonicalName(self, uncanName, canName):
+        real=self.cannonicalToReal.get(canName)
+        if real == None:
+            self._Remember(self.cannonicalToReal, canName, uncanName)
+        else:
+            if ([x.isupper() for x in uncanName].count(True) > [x.isupper() for x in real].count(True)):
+                self.cannonicalToReal[canName]=uncanName
+
+    # -----------------------------------
+    # Look up the real name which a cannonical name came from.  Returns None if we don't know it.
+    def Uncannonicize(self, name):
+        real=self.cannonicalToReal.get(name)
+        if real is not None:
+            self.cannonicalToReal.move_to_end(name)
+        return real
+
+    # -----------------------------------
+    # Add an entry to one of the dictionaries, dropping the least recently used entry if it's full
+    def _Remember(self, d, key, value):
+        d[key]=value
+        if self.maxSize is not None and len(d) > self.maxSize:
+            d.popitem(last=False)
+
+    # -----------------------------------
+    def Stats(self):
+        return {"Hits": self.Hits, "Misses": self.Misses, "Wikidot": len(self.wikidot), "Mediawiki": len(self.mediawiki), "Reverse": len(self.cannonicalToReal), "MaxSize": self.maxSize}
+
+
+# The cache used by the module-level functions below
+canonCache=CanonicalizationCache()
+
+# The reverse-lookup index, under its old name.  (It's the cache's own dictionary, so it's now limited to maxSize entries like the rest of the cache.)
+cannonicalToReal=canonCache.cannonicalToReal
+
+
+# *****************************************************************
+# Return the Wikidot cannonicized form of a raw name (using the module's canonicalization cache)
+def Cannonicize(pageNameZip):
+    return canonCache.Cannonicize(pageNameZip)
+
+
+# *****************************************************************
+# Return the Mediawiki canonicized form of a name (using the module's canonicalization cache)
+def MediawikiCanonicize(name):
+    return canonCache.MediawikiCanonicize(name)
 
 
 # *****************************************************************
 # Potentially add this entry to the list of uncannonicized page names
 def AddUncannonicalName(uncanName, canName):
-    if cannonicalToReal.get(canName) == None:
-        cannonicalToReal[canName]=uncanName
-    else:
-        if ([x.isupper() for x in uncanName].count(True) > [x.isupper() for x in cannonicalToReal[canName]].count(True)):
-            cannonicalToReal[canName]=uncanName
+    canonCache.AddUncannonicalName(uncanName, canName)
 
 
 # *****************************************************************
 def Uncannonicize(name):
-    n=cannonicalToReal.get(name)
+    n=canonCache.Uncannonicize(name)
     if n != None:
         return n
 
@@ -104,15 +283,13 @@ def InterestingFilenameZip(filenameZip):
     if len(filenameZip) <= 11:  # There needs to be something there besides 'source/.txt'
            return None
 
-    # These files are specific to Fancyclopedia and are known to be ignorable
-    if filenameZip.startswith("source/index_people"):  # Pages with names "source/index_people..." are index pages, not content pages.
-        return None
-    if filenameZip.startswith("source/index_alphanumeric"):  # Likewise
-        return None
-    if filenameZip.startswith("source/testing_alphanumeric"):  # Likewise
-        return None
+    name=filenameZip[7:-4]  # Drop "source/" and ".txt", returning the cleaned name
 
-    return filenameZip[7:-4]  # Drop "source/" and ".txt", returning the cleaned name
+    # The index_ pages are index pages, not content pages, and the testing_alphanumeric pages are specific to Fancyclopedia and are known to be
+    # ignorable.  (These are the rules the site loader uses for a site directory, too.)
+    if not SiteDiscovery.DefaultRules.IncludePage(name):
+        return None
+    return name
 
 
 # *****************************************************************
@@ -0,0 +1,112 @@
+import os
+import zipfile
+import Metrics
+import SiteLoader
+import SiteDiscovery
+import WikidotHelpers
+
+# Load a site straight from a zipped Wikidot backup, without extracting it to disk
+#
+# The pages are the source/<name>.txt members of the archive.  A real Wikidot backup holds just the pages' sources (and their attached files,
+# under files/), so a page's title is taken from its name and it has no tags (see SiteLoader.ParsePage).  But if there is a source/<name>.xml
+# member beside a page -- that is, the zip holds the same files as a site directory, under source/ -- its metadata is read from that, and the
+# page gets exactly the PageInfo (and the same key) that loading the extracted source/ directory would give it.  Either way the members are read
+# directly out of the archive and parsed by the same code as the files of an extracted site.  The pages come in archive order, as those of a
+# directory come in directory order.
+#
+# A ZipSource can be used anywhere SiteLoader takes a directory path for the pages' files, so both the serial and the parallel loaders work.
+# Each worker process opens the archive for itself (once), and reads and decompresses its own pages.
+# The PageCache is not used: it relies on the pages' files' timestamps on disk.
+
+
+# The open ZipFiles, by pathname, with the ID of the process which opened each one.  ZipFile objects can't be sent to the worker processes, and
+# one inherited by a forked worker would share its file position with the parent, so each process opens its own.
+_openZips={}
+
+
+# *****************************************************************
+class ZipSource:
+    def __init__(self, pathname, prefix="source/"):
+        self.pathname=pathname
+        self.prefix=prefix
+
+    # Only the pathname and prefix are sent to the worker processes
+    def __getstate__(self):
+        return {"pathname": self.pathname, "prefix": self.prefix}
+
+    # -----------------------------------
+    def Zip(self):
+        pid, zip=_openZips.get(self.pathname, (None, None))
+        if pid != os.getpid():
+            zip=zipfile.ZipFile(self.pathname)
+            _openZips[self.pathname]=(os.getpid(), zip)
+        return zip
+
+    def Close(self):
+        pid, zip=_openZips.pop(self.pathname, (None, None))
+        if pid == os.getpid():
+            zip.close()
+
+    # -----------------------------------
+    # Read the raw contents of a page's metadata and source (the same as SiteLoader.ReadPageFiles does for a page on disk)
+    # The metadata is None if the page has no .xml member.
+    def ReadFiles(self, fname):
+        zip=self.Zip()
+        name=self.prefix+fname
+        try:
+            xmlBytes=zip.read(name+".xml")
+        except KeyError:
+            xmlBytes=None
+        return xmlBytes, zip.read(name+".txt")
+
+    # -----------------------------------
+    # Generate the names of the pages in the archive, using the same rules as SiteDiscovery.DiscoverPages does for a directory, except that a
+    # page's companion (metadata) member is used if it's there but isn't required.
+    # In a Wikidot backup (whose pages are under source/), WikidotHelpers.InterestingFilenameZip picks out the pages.  (It applies DefaultRules.)
+    def DiscoverPages(self, rules=None):
+        if rules is None:
+            rules=SiteDiscovery.DefaultRules
+        ext=rules.extension
+        extLen=len(ext)
+        prefixLen=len(self.prefix)
+        for member in self.Zip().namelist():
+            if not member.startswith(self.prefix) or member[-extLen:].lower() != ext:
+                continue
+            if self.prefix == "source/" and ext == ".txt":
+                fname=WikidotHelpers.InterestingFilenameZip(member)
+                if fname is None:
+                    continue
+            else:
+                fname=member[prefixLen:-extLen]
+            dirs=fname.split("/")
+            name=dirs.pop()
+            if not rules.IncludePage(name) or not all(rules.IncludeDir(d) for d in dirs):
+                continue
+            yield fname
+
+
+# *****************************************************************
+# Is pathname a zip archive (rather than a site directory)?
+def IsZipSite(pathname):
+    return os.path.isfile(pathname) and zipfile.is_zipfile(pathname)
+
+
+# *****************************************************************
+# Load the pages in a zipped backup into site
+# workers, rules and queueSize are as for SiteLoader.LoadDirectory; prefix is the folder in the archive which holds the pages.
+# Raises ValueError if the archive holds no pages.  (It's probably not a Wikidot backup.)
+def LoadZip(site, pathname, workers=1, rules=None, prefix="source/", queueSize=256):
+    with Metrics.metrics.Phase("LoadZip"):
+        source=ZipSource(pathname, prefix)
+        try:
+            if workers == 0:
+                workers=os.cpu_count() or 1
+            count=0
+            for fname, pageInfo in SiteLoader.LoadPagesPipelined(source, source.DiscoverPages(rules), workers, None, queueSize):
+                site[fname]=pageInfo
+                SiteLoader.CountPage(pageInfo)
+                count+=1
+        finally:
+            source.Close()
+    if count == 0:
+        raise ValueError("No pages found under '"+prefix+"' in '"+pathname+"'")
@@ -0,0 +1,41 @@
+import random
+import pytest
+import WikidotHelpers
+import Benchmark
+
+# The fast and batch canonicizers must give exactly what the reference versions (CannonicizeUncached, MediawikiCanonicizeUncached) give.
+# The names are Benchmark's conformance corpus: the hand-picked corner cases, plus random names drawn from an alphabet of troublesome characters.
+
+
+#==================================================================
+@pytest.mark.parametrize("name", Benchmark.CanonicizeCorpus)
+def test_Corpus(name):
+    expected=WikidotHelpers.CannonicizeUncached(name)
+    assert WikidotHelpers.CannonicizeFast(name) == expected
+    assert WikidotHelpers.CannonicizeBatch([name]) == [expected[0]]
+    assert WikidotHelpers.MediawikiCanonicizeFast(name) == WikidotHelpers.MediawikiCanonicizeUncached(name)
+
+
+def test_RandomCorpus():
+    names=Benchmark.MakeCanonicizeCorpus(20000, random.Random(0))
+    assert Benchmark.CheckCanonicizeConformance(names) == len(names)
+
+
+def test_AsciiBatch():
+    names=[n for n in Benchmark.MakeCanonicizeCorpus(5000, random.Random(1)) if n.isascii()]
+    assert WikidotHelpers.CannonicizeBatch(names) == [WikidotHelpers.CannonicizeUncached(n)[0] for n in names]
+
+
+#==================================================================
+def test_BatchEdgeCases():
+    assert WikidotHelpers.CannonicizeBatch([]) == []
+    assert WikidotHelpers.CannonicizeBatch([None, "A Page", None]) == [None, "a-page", None]
+    # A name containing the NUL used to join a batch
+    assert WikidotHelpers.CannonicizeBatch(["a\0b", "C d"]) == [WikidotHelpers.CannonicizeUncached("a\0b")[0], "c-d"]
+
+
+def test_Cache():
+    cache=WikidotHelpers.CanonicalizationCache(maxSize=4)
+    for name in Benchmark.CanonicizeCorpus*2:
+        assert cache.Cannonicize(name) == WikidotHelpers.CannonicizeUncached(name)[0]
+        assert cache.MediawikiCanonicize(name) == WikidotHelpers.MediawikiCanonicizeUncached(name)
@@ -0,0 +1,24 @@
+import SiteLoader
+import SiteDiscovery
+import SiteGenerator
+import CaseAnalysis
+import LinkGroups
+import ExternalSort
+
+# The on-disk grouping must give exactly the groups of the in-memory path, whether it reads a loaded site or streams the pages from the loader
+
+
+#==================================================================
+def test_SameGroupsAsInMemory(tmp_path):
+    root=str(tmp_path/"site")
+    SiteGenerator.GenerateSite(root, pages=300)
+    site={}
+    SiteLoader.LoadDirectory(site, root)
+    expected=list(LinkGroups.GroupLinks(CaseAnalysis.BuildInverseSite(site)))
+
+    # A tiny budget, so that there are many runs and several merge passes
+    assert list(ExternalSort.GroupLinksExternal(site.items(), 20000, str(tmp_path), maxFanIn=4)) == expected
+
+    # Straight from the loader, without keeping the site
+    pages=SiteLoader.LoadPagesPipelined(root, SiteDiscovery.DiscoverPages(root))
+    assert list(ExternalSort.GroupLinksExternal(pages, 20000, str(tmp_path), maxFanIn=4)) == expected
@@ -0,0 +1,25 @@
+import LinkSpelling
+from SiteLoader import PageInfo
+
+# The misspellings report must come out the same however inverseSite happens to be ordered
+
+
+#==================================================================
+def MakeSite():
+    site={}
+    for name, title in [("john-smith", "John Smith"), ("farmer", "Farmer"), ("ansible", "Ansible"), ("worldcon", "Worldcon")]:
+        site[name]=PageInfo(title, name, None, set(), None)
+    return site
+
+
+def test_SortedWhateverTheOrder():
+    site=MakeSite()
+    links={"Jon Smith": ["farmer"], "Färmer": ["ansible"], "ANSIBEL": ["john-smith"], "Wrldcon": ["farmer", "ansible"], "Nowhere At All": ["farmer"],
+           "John Smith": ["worldcon"]}
+    forward=dict(links)
+    backward=dict(reversed(list(links.items())))
+
+    found=LinkSpelling.ProbableMisspellings(site, forward)
+    assert found == LinkSpelling.ProbableMisspellings(site, backward)
+    assert [m.Link for m in found] == ["ANSIBEL", "Färmer", "Jon Smith", "Wrldcon"]
+    assert [(m.Target, m.Distance) for m in found] == [("ansible", 1), ("farmer", 0), ("john-smith", 1), ("worldcon", 1)]
@@ -0,0 +1,56 @@
+import io
+import os
+import MetadataReader
+import SiteLoader
+import Redirects
+import CaseAnalysis
+
+# A directory site: pages in the top directory and in a subdirectory, an index page (which the loader skips), and a redirect chain whose pages
+# have no <title>
+
+
+#==================================================================
+def WritePage(dir, name, source, xml):
+    pathname=os.path.join(dir, name)
+    os.makedirs(os.path.dirname(pathname), exist_ok=True)
+    with open(pathname+".txt", "w") as f:
+        f.write(source)
+    with open(pathname+".xml", "w") as f:
+        f.write(xml)
+
+def MakeSite(dir):
+    WritePage(dir, "john-smith", "A fan.", "<data><title>John Smith</title><tags><tag>fan</tag></tags></data>")
+    WritePage(dir, "jon-smith", '[[module Redirect destination="johnny-smith"]]', "<data><updated_at>2019-02-07 12:00:00</updated_at></data>")
+    WritePage(dir, "johnny-smith", '[[module Redirect destination="nobody"]]', "<data><title></title></data>")
+    WritePage(dir, "index_people-j", "An index page, which is skipped", "<data><title>People: J</title></data>")
+    WritePage(dir, "more/jane-smith", "Another fan.", "<data><title>Jane Smith</title></data>")
+    return dir
+
+
+#==================================================================
+def test_MissingTitleIsPageName(tmp_path):
+    dir=MakeSite(str(tmp_path))
+    site={}
+    SiteLoader.LoadDirectory(site, dir)
+    assert site["jon-smith"].Title == "jon-smith"
+    assert site["johnny-smith"].Title == "johnny-smith"
+    assert site["john-smith"].Title == "John Smith"
+
+    # The redirect reports show the untitled pages by name rather than failing
+    redirects=Redirects.RedirectResolver(site)
+    f=io.StringIO()
+    assert CaseAnalysis.ReportDoubleRedirects(site, redirects, f) == 1
+    assert "jon-smith  ==>  johnny-smith  ==>  (missing) nobody" in f.getvalue()
+    f=io.StringIO()
+    assert CaseAnalysis.ReportMissingRedirectTargets(site, redirects, f) == 1
+    assert "johnny-smith  ==>  nobody" in f.getvalue()
+
+
+def test_IndexMatchesSite(tmp_path):
+    dir=MakeSite(str(tmp_path))
+    site={}
+    SiteLoader.LoadDirectory(site, dir)
+    index=MetadataReader.ReadMetadataIndex(dir)
+    assert list(index.keys()) == list(site.keys())
+    assert index[os.path.join("more", "jane-smith")] == MetadataReader.PageMetadata("Jane Smith", None)
+    assert index["jon-smith"] == MetadataReader.PageMetadata(None, None)
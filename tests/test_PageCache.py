@@ -0,0 +1,113 @@
+import os
+import pickle
+import PageCache
+import SiteLoader
+
+
+#==================================================================
+def WritePage(dir, name, source, title="A Page"):
+    pathname=os.path.join(dir, name)
+    with open(pathname+".xml", "wb") as f:
+        f.write(("<data><title>"+title+"</title></data>").encode())
+    with open(pathname+".txt", "wb") as f:
+        f.write(source.encode())
+    return pathname
+
+def Touch(pathname, ns):
+    for ext in (".xml", ".txt"):
+        os.utime(pathname+ext, ns=(ns, ns))
+
+# Parse a page and store it in the cache, as the loader does
+def StorePage(cache, dir, name):
+    pageInfo, stamp=cache.Lookup(dir, name)
+    assert pageInfo is None
+    xmlBytes, sourceBytes=SiteLoader.ReadPageFiles(dir, name)
+    pageInfo=SiteLoader.ParsePage(name, xmlBytes, sourceBytes)
+    cache.Store(dir, name, stamp, PageCache.PageDigest(xmlBytes, sourceBytes), pageInfo)
+    return pageInfo
+
+def MakeCache(tmp_path):
+    dir=str(tmp_path)
+    cache=PageCache.PageCache(os.path.join(dir, "PageCache.pickle"))
+    cache.CheckRules(SiteLoader.LinkRulesVersion)
+    return dir, cache
+
+
+#==================================================================
+def test_StampChangeSameContentIsHit(tmp_path):
+    dir, cache=MakeCache(tmp_path)
+    pathname=WritePage(dir, "john-smith", "See [[[Jane Smith]]].")
+    Touch(pathname, 1000000000)
+    pageInfo=StorePage(cache, dir, "john-smith")
+
+    Touch(pathname, 2000000000)
+    assert cache.Lookup(dir, "john-smith")[0] == pageInfo
+    assert (cache.Hits, cache.Misses) == (1, 1)
+
+    # The new stamp was recorded, so the next lookup needn't re-read the page
+    cache.Save()
+    reloaded=PageCache.PageCache(cache.filename)
+    assert reloaded.entries[pathname][0] == PageCache.PageStamp(pathname)
+
+
+def test_ContentChangeIsMiss(tmp_path):
+    dir, cache=MakeCache(tmp_path)
+    pathname=WritePage(dir, "john-smith", "See [[[Jane Smith]]].")
+    Touch(pathname, 1000000000)
+    StorePage(cache, dir, "john-smith")
+
+    # Same size, different contents
+    WritePage(dir, "john-smith", "See [[[Jone Smith]]].")
+    Touch(pathname, 2000000000)
+    assert cache.Lookup(dir, "john-smith")[0] is None
+
+    # Different size
+    WritePage(dir, "john-smith", "See [[[Jane Smith]]] and [[[John Doe]]].")
+    assert cache.Lookup(dir, "john-smith")[0] is None
+    assert (cache.Hits, cache.Misses) == (0, 3)
+
+
+def test_RulesVersionChangeDropsEntries(tmp_path):
+    dir, cache=MakeCache(tmp_path)
+    WritePage(dir, "john-smith", "A fan.")
+    StorePage(cache, dir, "john-smith")
+    cache.Save()
+
+    cache=PageCache.PageCache(cache.filename)
+    cache.CheckRules(SiteLoader.LinkRulesVersion)
+    assert len(cache.entries) == 1
+    cache.CheckRules(SiteLoader.LinkRulesVersion+1)
+    assert cache.entries == {}
+    assert cache.Lookup(dir, "john-smith")[0] is None
+
+
+def test_PruneRemovesDeletedPages(tmp_path):
+    dir, cache=MakeCache(tmp_path)
+    WritePage(dir, "john-smith", "A fan.")
+    pathname=WritePage(dir, "jane-smith", "Another fan.")
+    StorePage(cache, dir, "john-smith")
+    StorePage(cache, dir, "jane-smith")
+
+    os.remove(pathname+".txt")
+    assert cache.Prune() == 1
+    assert list(cache.entries) == [os.path.join(dir, "john-smith")]
+    assert cache.Prune(keep=[]) == 1
+    assert cache.entries == {}
+
+
+def test_BadCacheFileIsEmpty(tmp_path):
+    dir, cache=MakeCache(tmp_path)
+    WritePage(dir, "john-smith", "A fan.")
+    StorePage(cache, dir, "john-smith")
+    cache.Save()
+
+    with open(cache.filename, "rb") as f:
+        data=pickle.load(f)
+    data["CacheVersion"]=PageCache.CacheVersion+1
+    with open(cache.filename, "wb") as f:
+        pickle.dump(data, f)
+    assert PageCache.PageCache(cache.filename).entries == {}
+
+    with open(cache.filename, "wb") as f:
+        f.write(b"not a pickle")
+    assert PageCache.PageCache(cache.filename).entries == {}
@@ -0,0 +1,57 @@
+import SiteLoader
+import Redirects
+from Redirects import Resolution
+
+# Each site is given as a dict of page name -> the page it redirects to (None for a real page)
+
+
+#==================================================================
+def MakeSite(pages):
+    return {name: SiteLoader.PageInfo(name, name, None, set(), redirect) for name, redirect in pages.items()}
+
+
+#==================================================================
+def test_SelfRedirect():
+    redirects=Redirects.RedirectResolver(MakeSite({"a": "a"}))
+    assert redirects.Resolve("a") == Resolution(None, Redirects.Cycle, 1)
+    assert redirects.Chain("a") == ["a"]
+    assert redirects.Cycles() == ["a"]
+    assert redirects.MissingTargets() == []
+
+
+def test_ChainIntoCycle():
+    # a leads into the cycle b -> c -> b
+    redirects=Redirects.RedirectResolver(MakeSite({"a": "b", "b": "c", "c": "b"}))
+    assert redirects.Resolve("a") == Resolution(None, Redirects.Cycle, 3)
+    assert redirects.Resolve("b") == Resolution(None, Redirects.Cycle, 2)
+    assert redirects.Resolve("c") == Resolution(None, Redirects.Cycle, 2)
+    assert redirects.Chain("a") == ["a", "b", "c"]
+    assert redirects.Cycles() == ["a", "b", "c"]
+    assert Redirects.DoubleRedirectOf(redirects, "a") == Redirects.DoubleRedirect(["a", "b", "c"], Redirects.Cycle, "b")
+
+
+def test_TwoHopsToMissingPage():
+    redirects=Redirects.RedirectResolver(MakeSite({"a": "b", "b": "nobody", "x": None}))
+    assert redirects.Resolve("a") == Resolution("nobody", Redirects.Missing, 2)
+    assert redirects.Resolve("b") == Resolution("nobody", Redirects.Missing, 1)
+    assert redirects.Resolve("x") is None
+    assert redirects.Chain("a") == ["a", "b"]
+    assert redirects.MultipleRedirects() == ["a"]
+    assert redirects.MissingTargets() == ["b"]
+    assert Redirects.DoubleRedirectOf(redirects, "a") == Redirects.DoubleRedirect(["a", "b"], Redirects.Missing, "nobody")
+
+
+def test_UpdateFillsMissingTarget():
+    site=MakeSite({"a": "b", "b": "nobody", "x": None})
+    redirects=Redirects.RedirectResolver(site)
+    site.update(MakeSite({"nobody": None}))
+    assert redirects.Update({"nobody"}) == {"nobody", "b", "a"}
+    assert redirects.Resolve("a") == Resolution("nobody", Redirects.Resolved, 2)
+    assert redirects.Resolve("b") == Resolution("nobody", Redirects.Resolved, 1)
+    assert redirects.Chain("a") == ["a", "b", "nobody"]
+    assert redirects.MissingTargets() == []
+    assert Redirects.DoubleRedirectOf(redirects, "a") == Redirects.DoubleRedirect(["a", "b", "nobody"], Redirects.Resolved, None)
+
+    # The result is the same as resolving the updated site from scratch
+    fresh=Redirects.RedirectResolver(site)
+    assert redirects.resolutions == fresh.resolutions
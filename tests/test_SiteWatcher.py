@@ -0,0 +1,61 @@
+import os
+import time
+import SiteWatcher
+import WikidotHelpers
+
+# The watcher must survive a page which is caught half written, and must keep site and inverseSite in the order a fresh load gives
+
+
+#==================================================================
+def WritePage(root, name, source, title=None, xml=None):
+    with open(os.path.join(root, name+".txt"), "w") as f:
+        f.write(source)
+    if xml is None:
+        WikidotHelpers.SaveMetadata(os.path.join(root, name), {"title": title or name, "tags": []})
+    else:
+        with open(os.path.join(root, name+".xml"), "w") as f:
+            f.write(xml)
+    # Make sure the stamps change, however coarse the file system's timestamps
+    t=time.time_ns()+10**9*len(os.listdir(root))
+    for ext in (".txt", ".xml"):
+        os.utime(os.path.join(root, name+ext), ns=(t, t))
+
+
+def MakeSite(root):
+    WritePage(root, "start", "[[[John Smith]]] [[[Jon Smith]]]")
+    WritePage(root, "john-smith", "[[[Start]]]")
+    WritePage(root, "jon-smith", '[[module Redirect destination="john-smith"]]')
+
+
+#==================================================================
+def test_HalfWrittenPage(tmp_path):
+    root=str(tmp_path)
+    MakeSite(root)
+    watcher=SiteWatcher.SiteWatcher(root)
+    before=watcher.site["start"]
+    stamp=watcher.stamps["start"]
+
+    WritePage(root, "start", "[[[Elsewhere]]]", xml="<data><title>half")
+    watcher.Poll()
+    assert watcher.site["start"] is before
+    assert watcher.stamps["start"] == stamp
+    assert "Elsewhere" not in watcher.inverseSite
+
+    WritePage(root, "start", "[[[Elsewhere]]]")
+    watcher.Poll()
+    assert watcher.site["start"].Links == {"Elsewhere"}
+    assert watcher.inverseSite["Elsewhere"] == ["start"]
+
+
+def test_AddedPagesInLoaderOrder(tmp_path):
+    root=str(tmp_path)
+    MakeSite(root)
+    watcher=SiteWatcher.SiteWatcher(root)
+    for name in ("a-fan", "b-fan", "c-fan"):
+        WritePage(root, name, "[[[John Smith]]]")
+    watcher.Poll()
+
+    fresh=SiteWatcher.SiteWatcher(root)
+    assert list(watcher.site) == list(fresh.site)
+    assert watcher.inverseSite == fresh.inverseSite
+    assert watcher.inverseSite["John Smith"] == fresh.inverseSite["John Smith"]
@@ -0,0 +1,86 @@
+import zipfile
+import pytest
+import ZipSite
+import SiteLoader
+import WikidotHelpers
+
+# A zip shaped like a real Wikidot backup: the pages' sources under source/, their attached files under files/, and no metadata
+
+
+#==================================================================
+def MakeBackup(pathname):
+    with zipfile.ZipFile(pathname, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("source/start.txt", "Welcome.  See [[[John Smith]]] and [[[category:Fanzines|the fanzines]]].")
+        z.writestr("source/john-smith.txt", "A fan.  Not to be confused with [[[Jon Smith]]].")
+        z.writestr("source/jon-smith.txt", '[[module Redirect destination="john-smith"]]')
+        z.writestr("source/category_fanzines.txt", "Fanzines, such as [[[Slan|Slán]]].")
+        z.writestr("source/index_people-a.txt", "An index page, which is skipped")
+        z.writestr("files/john-smith/photo.jpg", b"\xff\xd8\xff")
+    return pathname
+
+
+#==================================================================
+def test_LoadBackup(tmp_path):
+    pathname=MakeBackup(str(tmp_path/"backup.zip"))
+    site={}
+    ZipSite.LoadZip(site, pathname)
+
+    assert list(site.keys()) == ["start", "john-smith", "jon-smith", "category_fanzines"]
+    assert site["start"] == SiteLoader.PageInfo("start", "start", None, {"John Smith", "category:Fanzines"}, None)
+    assert site["jon-smith"].Redirect == "john-smith"
+    assert site["category_fanzines"].Title == "category:fanzines"
+    assert site["category_fanzines"].Links == {"Slan"}
+
+
+def test_LoadBackupParallel(tmp_path):
+    pathname=MakeBackup(str(tmp_path/"backup.zip"))
+    site={}
+    ZipSite.LoadZip(site, pathname)
+    parallelSite={}
+    ZipSite.LoadZip(parallelSite, pathname, workers=2)
+    assert parallelSite == site
+    assert list(parallelSite.keys()) == list(site.keys())
+
+
+def test_MetadataIsUsedIfPresent(tmp_path):
+    pathname=str(tmp_path/"site.zip")
+    with zipfile.ZipFile(pathname, "w") as z:
+        z.writestr("source/john-smith.txt", "A fan.")
+        z.writestr("source/john-smith.xml", "<data><title>John Smith</title><tags><tag>fan</tag></tags></data>")
+        z.writestr("source/jon-smith.txt", "Another fan.")
+    site={}
+    ZipSite.LoadZip(site, pathname)
+    assert site["john-smith"].Title == "John Smith"
+    assert site["jon-smith"].Title == "jon-smith"
+    assert site["jon-smith"].Tags is None
+
+
+def test_NoPages(tmp_path):
+    pathname=str(tmp_path/"empty.zip")
+    with zipfile.ZipFile(pathname, "w") as z:
+        z.writestr("files/john-smith/photo.jpg", b"\xff\xd8\xff")
+    with pytest.raises(ValueError):
+        ZipSite.LoadZip({}, pathname)
+
+
+#==================================================================
+# A zip of a site directory must give exactly what loading the directory gives, skipping the same pages
+def test_SameAsDirectory(tmp_path):
+    root=tmp_path/"source"
+    root.mkdir()
+    pages={"page": "[[[Other Page]]]", "other-page": '[[module Redirect destination="page"]]', "index_foo": "[[[Page]]]",
+           "index_people-a": "[[[Page]]]", "testing_alphanumeric-1": "[[[Page]]]", "category_fanzines": "[[[Page|A page]]]"}
+    for name, source in pages.items():
+        (root/(name+".txt")).write_text(source)
+        WikidotHelpers.SaveMetadata(str(root/name), {"title": name.title(), "tags": ["fan"]})
+    pathname=str(tmp_path/"site.zip")
+    with zipfile.ZipFile(pathname, "w") as z:
+        for path in sorted(root.iterdir()):
+            z.write(str(path), "source/"+path.name)
+
+    site={}
+    SiteLoader.LoadDirectory(site, str(root))
+    zipSite={}
+    ZipSite.LoadZip(zipSite, pathname)
+    assert zipSite == site
+    assert sorted(zipSite) == ["category_fanzines", "other-page", "page"]